@@ -3346,11 +3346,12 @@ def perfrevlogindex(ui, repo, file_=None, **opts):
         (b'd', b'dist', 100, b'distance between the revisions'),
         (b's', b'startrev', 0, b'revision to start reading at'),
         (b'', b'reverse', False, b'read in reverse'),
+        (b'', b'batched', False, b'read all revisions with one call'),
     ],
     b'-c|-m|FILE',
 )
 def perfrevlogrevisions(
-    ui, repo, file_=None, startrev=0, reverse=False, **opts
+    ui, repo, file_=None, startrev=0, reverse=False, batched=False, **opts
 ):
     """Benchmark reading a series of revisions from a revlog.
 
@@ -3358,6 +3359,9 @@ def perfrevlogrevisions(
     the specified revlog.
 
     The start revision can be defined via ``-s/--startrev``.
+
+    With ``--batched``, the revisions are restored together through
+    ``revlog.revisions()``.
     """
     opts = _byteskwargs(opts)
 
@@ -3378,6 +3382,11 @@ def perfrevlogrevisions(
             beginrev, endrev = endrev - 1, beginrev - 1
             dist = -1 * dist
 
+        if batched:
+            for __ in rl.revisions(_xrange(beginrev, endrev, dist)):
+                pass
+            return
+
         for x in _xrange(beginrev, endrev, dist):
             # Old revisions don't support passing int.
             n = rl.node(x)
@@ -3701,6 +3710,12 @@ def _temprevlog(ui, orig, truncaterev):
     + [
         (b'e', b'engines', b'', b'compression engines to use'),
         (b's', b'startrev', 0, b'revision to start at'),
+        (
+            b'',
+            b'decompression-threads',
+            4,
+            b'threads used by the threaded "chunk batch" benchmark',
+        ),
     ],
     b'-c|-m|FILE',
 )
@@ -3833,6 +3848,15 @@ def perfrevlogchunks(ui, repo, file_=None, engines=None, startrev=0, **opts):
                 # Save chunks as a side-effect.
                 chunks[0] = _chunks(revs)
 
+    def dochunkbatchthreaded(threads):
+        data_config = rl._inner.data_config
+        old_threads = data_config.decompression_threads
+        try:
+            data_config.decompression_threads = threads
+            dochunkbatch()
+        finally:
+            data_config.decompression_threads = old_threads
+
     def docompress(compressor):
         rl.clearcaches()
 
@@ -3856,6 +3880,18 @@ def perfrevlogchunks(ui, repo, file_=None, engines=None, startrev=0, **opts):
         (lambda: dochunkbatch(), b'chunk batch'),
     ]
 
+    # threaded decompression is not available in older versions
+    inner = getattr(rl, '_inner', None)
+    data_config = getattr(inner, 'data_config', None)
+    if safehasattr(data_config, 'decompression_threads'):
+        threads = opts[b'decompression_threads']
+        benches.append(
+            (
+                functools.partial(dochunkbatchthreaded, threads),
+                b'chunk batch w/ %d threads' % threads,
+            )
+        )
+
     for engine in sorted(engines):
         compressor = util.compengines[engine].revlogcompressor()
         benches.append(
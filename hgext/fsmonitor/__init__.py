@@ -79,6 +79,24 @@ beneficial to performance but isn't enabled.
 If ``warn_when_unused`` is set and fsmonitor isn't enabled, a warning will
 be printed during working directory updates if this many files will be
 created.
+
+::
+
+    [fsmonitor]
+    backend = {watchman, inotify}
+
+The file watching service to use. With `inotify`, available on Linux only,
+Watchman is not needed: a watcher process is started for each working copy
+the first time its status is requested. Defaults to `watchman`.
+
+::
+
+    [fsmonitor]
+    inotify.idle-timeout = (integer)
+
+The number of seconds after which an inotify watcher that did not receive
+any request exits. 0 keeps it running until its working copy is removed.
+Defaults to `3600`.
 '''
 
 # Platforms Supported
@@ -130,6 +148,7 @@ from mercurial import (
     pycompat,
     registrar,
     scmutil,
+    server,
     util,
 )
 
@@ -142,6 +161,7 @@ from mercurial.utils import (
 )
 
 from . import (
+    inotify,
     pywatchman,
     state,
     watchmanclient,
@@ -153,6 +173,9 @@ from . import (
 # leave the attribute unspecified.
 testedwith = b'ships-with-hg-core'
 
+cmdtable = {}
+command = registrar.command(cmdtable)
+
 configtable = {}
 configitem = registrar.configitem(configtable)
 
@@ -161,6 +184,16 @@ configitem(
     b'mode',
     default=b'on',
 )
+configitem(
+    b'fsmonitor',
+    b'backend',
+    default=b'watchman',
+)
+configitem(
+    b'fsmonitor',
+    b'inotify.idle-timeout',
+    default=3600,
+)
 configitem(
     b'fsmonitor',
     b'walk_on_invalidate',
@@ -332,7 +365,7 @@ def overridewalk(orig, self, match, subrepos, unknown, ignored, full=True):
     matchfn = match.matchfn
     matchalways = match.always()
     dmap = self._map
-    if hasattr(dmap, b'_map'):
+    if hasattr(dmap, '_map'):
         # for better performance, directly access the inner dirstate map if the
         # standard dirstate implementation is in use.
         dmap = dmap._map
@@ -744,7 +777,7 @@ def makedirstate(repo, dirstate):
 def wrapdirstate(orig, self):
     ds = orig(self)
     # only override the dirstate when Watchman is available for the repo
-    if hasattr(self, b'_fsmonitorstate'):
+    if hasattr(self, '_fsmonitorstate'):
         makedirstate(self, ds)
     return ds
 
@@ -811,7 +844,7 @@ class state_update:
             self.oldnode = self.repo[b'.'].node()
 
         if self.repo.currentwlock() is None:
-            if hasattr(self.repo, b'wlocknostateupdate'):
+            if hasattr(self.repo, 'wlocknostateupdate'):
                 self._lock = self.repo.wlocknostateupdate()
             else:
                 self._lock = self.repo.wlock()
@@ -839,7 +872,7 @@ class state_update:
                 self._lock.release()
 
     def _state(self, cmd, commithash, status=b'ok'):
-        if not hasattr(self.repo, b'_watchmanclient'):
+        if not hasattr(self.repo, '_watchmanclient'):
             return False
         try:
             self.repo._watchmanclient.command(
@@ -962,7 +995,14 @@ def reposetup(ui, repo):
             return
 
         try:
-            client = watchmanclient.client(repo.ui, repo.root)
+            if ui.config(b'fsmonitor', b'backend') == b'inotify':
+                if not inotify.supported():
+                    raise watchmanclient.Unavailable(
+                        b'inotify is not supported on this system'
+                    )
+                client = inotify.client(repo.ui, repo)
+            else:
+                client = watchmanclient.client(repo.ui, repo.root)
         except Exception as ex:
             _handleunavailable(ui, fsmonitorstate, ex)
             return
@@ -1014,3 +1054,40 @@ def reposetup(ui, repo):
                 return l
 
         repo.__class__ = fsmonitorrepo
+
+
+@command(
+    b'debug-fsmonitor-inotify',
+    [
+        (b'', b'stop', False, _(b'stop the watcher of the working copy')),
+        (b'd', b'daemon', None, _(b'run the watcher in background')),
+        (b'', b'daemon-postexec', [], _(b'used internally by daemon mode')),
+        (
+            b'',
+            b'pid-file',
+            b'',
+            _(b'name of file to write process ID to'),
+            _(b'FILE'),
+        ),
+    ],
+    _(b'[--stop] [-d] [--pid-file FILE]'),
+    helpcategory=command.CATEGORY_MAINTENANCE,
+)
+def debugfsmonitorinotify(ui, repo, **opts):
+    """run the inotify watcher of the working copy
+
+    The watcher is normally started on demand when the ``fsmonitor.backend``
+    config option is set to ``inotify``. It answers the fsmonitor queries
+    about the working copy through a socket in the ``.hg`` directory, until
+    it is stopped, idle for ``fsmonitor.inotify.idle-timeout`` seconds, or
+    the working copy is removed.
+    """
+    if not inotify.supported():
+        raise error.Abort(_(b'inotify is not supported on this system'))
+    opts = pycompat.byteskwargs(opts)
+    if opts[b'stop']:
+        if not inotify.shutdown(ui, repo):
+            ui.status(_(b'no inotify watcher running\n'))
+        return
+    service = inotify.server(ui, repo)
+    server.runservice(opts, initfn=service.init, runfn=service.run)
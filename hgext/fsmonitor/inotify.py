@@ -0,0 +1,588 @@
+# inotify.py - inotify based file watcher for the fsmonitor extension
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""a file watcher for Linux using inotify, as a replacement for Watchman
+
+The watcher is a daemon started on demand for each working copy. It keeps
+the set of paths changed since it started, and answers the subset of the
+Watchman protocol used by fsmonitor: ``clock`` and ``query`` with a ``since``
+clock. Requests and responses are CBOR values prefixed with their length,
+over a UNIX domain socket in the ``.hg`` directory.
+
+A clock is ``c:<instance>:<tick>``. Each batch of inotify events increments
+the tick. The instance changes when events were lost, for example when the
+inotify queue overflowed or when a directory was moved away. A query since
+a clock of another instance is answered with every file in the working
+copy, as for a fresh Watchman instance.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import selectors
+import socket
+import stat
+import struct
+import time
+
+from mercurial import (
+    pycompat,
+    util,
+)
+from mercurial.utils import (
+    cborutil,
+    procutil,
+    stringutil,
+)
+
+from . import watchmanclient
+
+# name of the socket of the daemon, in .hg/
+SOCKET_NAME = b'fsmonitor-inotify.sock'
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+
+_WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+
+# struct inotify_event: wd, mask, cookie, len, followed by the name
+_EVENT = struct.Struct('iIII')
+
+_FRAME = struct.Struct('>I')
+
+# seconds between checks that the daemon still owns its socket
+_CHECK_INTERVAL = 5
+
+
+def supported():
+    """Whether inotify can be used on this system"""
+    return pycompat.sysplatform.startswith(b'linux') and bool(
+        ctypes.util.find_library('c')
+    )
+
+
+class _inotify:
+    """a minimal binding of the inotify API"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, path, _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read(self):
+        """return the (wd, mask, name) of all the pending events"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, size = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + size].rstrip(b'\0')
+                offset += size
+                events.append((wd, mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _join(directory, name):
+    if directory:
+        return directory + b'/' + name
+    return name
+
+
+class watcher:
+    """keep track of the paths changed in a working copy"""
+
+    def __init__(self, root):
+        self._root = root
+        self._inotify = _inotify()
+        # {wd: directory}
+        self._dirs = {}
+        # {directory: wd}
+        self._wds = {}
+        # {path: tick of its last change}
+        self._changed = {}
+        self._tick = 0
+        self._generation = 0
+        self._newinstance()
+        self._addtree(b'')
+        # set when the root of the working copy went away
+        self.gone = False
+
+    @property
+    def fd(self):
+        return self._inotify.fd
+
+    def _newinstance(self):
+        """forget about the tracked changes, clients will see a fresh
+        instance and get the full list of files"""
+        self._generation += 1
+        self._instance = b'%d.%d.%d' % (
+            procutil.getpid(),
+            int(time.time()),
+            self._generation,
+        )
+        self._changed.clear()
+
+    def clock(self):
+        return b'c:%s:%d' % (self._instance, self._tick)
+
+    def _addtree(self, top, report=False):
+        """watch `top` and all its subdirectories
+
+        When `report` is set, everything found is recorded as changed: the
+        events about it happened before the watches existed."""
+        pending = [top]
+        while pending:
+            directory = pending.pop()
+            try:
+                path = os.path.join(self._root, directory)
+                wd = self._inotify.add_watch(path)
+            except OSError as inst:
+                if inst.errno in (errno.ENOENT, errno.ENOTDIR):
+                    # removed in the interim, events about it are pending
+                    continue
+                raise
+            self._dirs[wd] = directory
+            self._wds[directory] = wd
+            try:
+                entries = os.scandir(os.path.join(self._root, directory))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    path = _join(directory, entry.name)
+                    if path == b'.hg':
+                        continue
+                    if report:
+                        self._changed[path] = self._tick
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(path)
+
+    def _removetree(self, top):
+        """stop watching `top` and its subdirectories"""
+        prefix = top + b'/'
+        for directory in list(self._wds):
+            if directory == top or directory.startswith(prefix):
+                wd = self._wds.pop(directory)
+                del self._dirs[wd]
+                self._inotify.rm_watch(wd)
+
+    def process(self):
+        """record all the pending events"""
+        events = self._inotify.read()
+        if not events:
+            return
+        self._tick += 1
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self._newinstance()
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._dirs[wd]
+                if self._wds.get(directory) == wd:
+                    del self._wds[directory]
+                continue
+            if not name:
+                # the event is about the watched directory itself
+                if directory == b'' and mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self.gone = True
+                continue
+            path = _join(directory, name)
+            if path == b'.hg':
+                continue
+            self._changed[path] = self._tick
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._addtree(path, report=True)
+                elif mask & IN_MOVED_FROM:
+                    # the files below moved without any event about them
+                    self._removetree(path)
+                    self._newinstance()
+
+    def _entry(self, path):
+        try:
+            st = os.lstat(os.path.join(self._root, path))
+        except (FileNotFoundError, NotADirectoryError):
+            return [path, False, 0, 0, 0]
+        return [path, True, st.st_mode, st.st_size, st.st_mtime_ns]
+
+    def _allfiles(self):
+        pending = [b'']
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = os.scandir(os.path.join(self._root, directory))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    path = _join(directory, entry.name)
+                    if path == b'.hg':
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(path)
+                    yield path
+
+    def query(self, since, emptyonfresh=False):
+        """return the response to a query for the changes since `since`"""
+        fresh = True
+        if since.startswith(b'c:'):
+            instance, sep, tick = since[2:].rpartition(b':')
+            if sep and instance == self._instance and tick.isdigit():
+                fresh = False
+                tick = int(tick)
+        if fresh:
+            paths = [] if emptyonfresh else self._allfiles()
+        else:
+            paths = [p for p, t in self._changed.items() if t > tick]
+        return {
+            b'clock': self.clock(),
+            b'is_fresh_instance': fresh,
+            b'files': [self._entry(p) for p in paths],
+        }
+
+    def close(self):
+        self._inotify.close()
+
+
+def _send(sock, value):
+    data = b''.join(cborutil.streamencode(value))
+    sock.sendall(_FRAME.pack(len(data)) + data)
+
+
+def _recvexactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv(sock):
+    (size,) = _FRAME.unpack(_recvexactly(sock, _FRAME.size))
+    return cborutil.decodeall(_recvexactly(sock, size))[0]
+
+
+class server:
+    """answer the fsmonitor queries about a working copy"""
+
+    def __init__(self, ui, repo):
+        self._ui = ui
+        self._root = repo.root
+        self._sockpath = repo.vfs.join(SOCKET_NAME)
+        self._idletimeout = ui.configint(b'fsmonitor', b'inotify.idle-timeout')
+        self._watcher = None
+        self._listener = None
+        self._sockstat = None
+        self._stopped = False
+
+    def init(self):
+        """bind the socket and start watching the working copy"""
+        self._watcher = watcher(self._root)
+        self._listener = socket.socket(socket.AF_UNIX)
+        util.bindunixsocket(self._listener, self._sockpath)
+        self._listener.listen(5)
+        self._sockstat = os.stat(self._sockpath)
+        self._ui.log(
+            b'fsmonitor', b'inotify watcher started for %s\n', self._root
+        )
+
+    def _ownssocket(self):
+        try:
+            st = os.stat(self._sockpath)
+        except OSError:
+            return False
+        return (st.st_ino, st.st_dev) == (
+            self._sockstat.st_ino,
+            self._sockstat.st_dev,
+        )
+
+    def run(self):
+        sel = selectors.DefaultSelector()
+        sel.register(self._watcher.fd, selectors.EVENT_READ)
+        sel.register(self._listener, selectors.EVENT_READ)
+        lastactivity = lastcheck = time.time()
+        try:
+            while not self._stopped and not self._watcher.gone:
+                for key, _events in sel.select(timeout=_CHECK_INTERVAL):
+                    if key.fileobj == self._watcher.fd:
+                        self._watcher.process()
+                    elif key.fileobj is self._listener:
+                        conn = self._listener.accept()[0]
+                        sel.register(conn, selectors.EVENT_READ)
+                    else:
+                        lastactivity = time.time()
+                        if not self._serve(key.fileobj):
+                            sel.unregister(key.fileobj)
+                            key.fileobj.close()
+                now = time.time()
+                if now - lastcheck >= _CHECK_INTERVAL:
+                    lastcheck = now
+                    if not self._ownssocket():
+                        # the repository went away or another watcher
+                        # took over
+                        break
+                    idle = now - lastactivity
+                    if self._idletimeout and idle >= self._idletimeout:
+                        break
+        finally:
+            for key in list(sel.get_map().values()):
+                if isinstance(key.fileobj, socket.socket):
+                    key.fileobj.close()
+            sel.close()
+            if self._ownssocket():
+                util.tryunlink(self._sockpath)
+            self._watcher.close()
+
+    def _serve(self, conn):
+        """answer a request on `conn`, return False once it is closed"""
+        try:
+            request = _recv(conn)
+        except (EOFError, OSError, cborutil.CBORDecodeError):
+            return False
+        try:
+            response = self._dispatch(request)
+        except Exception as inst:
+            response = {b'error': stringutil.forcebytestr(inst)}
+        try:
+            _send(conn, response)
+        except OSError:
+            return False
+        return True
+
+    def _dispatch(self, request):
+        cmd, root = request[0], request[1]
+        if root != self._root:
+            return {b'error': b'unable to resolve root %s' % root}
+        # any change made before the request is already queued by the kernel
+        self._watcher.process()
+        if cmd == b'clock':
+            return {b'clock': self._watcher.clock()}
+        elif cmd == b'query':
+            args = request[2]
+            return self._watcher.query(
+                args.get(b'since', b''),
+                args.get(b'empty_on_fresh_instance', False),
+            )
+        elif cmd == b'version':
+            return {b'version': util.version()}
+        elif cmd in (b'watch', b'state-enter', b'state-leave'):
+            return {}
+        elif cmd == b'shutdown-server':
+            # new clients must not connect while this one exits
+            if self._ownssocket():
+                util.tryunlink(self._sockpath)
+            self._stopped = True
+            return {}
+        return {b'error': b'unknown command %s' % cmd}
+
+
+class _fileentry:
+    """a file of a query result, usable as a stat result"""
+
+    __slots__ = ('name', 'exists', 'st_mode', 'st_size', 'st_mtime_ns')
+
+    def __init__(self, name, exists, mode, size, mtime_ns):
+        self.name = name
+        self.exists = exists
+        self.st_mode = mode
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+
+    @property
+    def st_mtime(self):
+        return self.st_mtime_ns // 1000000000
+
+    def __getitem__(self, key):
+        if key == b'name':
+            return self.name
+        elif key == b'exists':
+            return self.exists
+        elif key == b'mode':
+            return self.st_mode
+        elif key == b'size':
+            return self.st_size
+        elif key == b'mtime':
+            return self.st_mtime
+        elif key == stat.ST_MTIME:
+            return self.st_mtime
+        raise KeyError(key)
+
+
+class client(watchmanclient.client):
+    """talk to the inotify watcher of a working copy, starting it if needed"""
+
+    def __init__(self, ui, repo, timeout=1.0):
+        super().__init__(ui, repo.root, timeout=timeout)
+        self._sockpath = repo.vfs.join(SOCKET_NAME)
+        self._sock = None
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+        if self._sock is not None:
+            self._sock.settimeout(timeout)
+
+    def getcurrentclock(self):
+        result = self.command(b'clock')
+        if not result.get(b'clock'):
+            raise watchmanclient.Unavailable(
+                b'clock result is missing clock value', invalidate=True
+            )
+        return result[b'clock']
+
+    def clearconnection(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def available(self):
+        return self._sock is not None or self._firsttime
+
+    def _connectonce(self):
+        sock = socket.socket(socket.AF_UNIX)
+        sock.settimeout(self._timeout)
+        # like util.bindunixsocket(), avoid the length limit of socket paths
+        dirname, basename = os.path.split(self._sockpath)
+        bakwdfd = os.open(b'.', os.O_DIRECTORY)
+        try:
+            os.chdir(dirname)
+            sock.connect(basename)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.fchdir(bakwdfd)
+            os.close(bakwdfd)
+        return sock
+
+    def _spawn(self):
+        lockfd, lockpath = pycompat.mkstemp(prefix=b'hg-fsmonitor-')
+        os.close(lockfd)
+        try:
+            args = procutil.hgcmd() + [
+                b'-R',
+                self._root,
+                b'--config',
+                b'extensions.fsmonitor=',
+                b'debug-fsmonitor-inotify',
+                b'--daemon-postexec=unlink:%s' % lockpath,
+            ]
+            pid = procutil.rundetached(
+                args, lambda: not os.path.exists(lockpath)
+            )
+        finally:
+            util.tryunlink(lockpath)
+        if pid < 0:
+            raise watchmanclient.Unavailable(b'inotify watcher failed to start')
+
+    def _connect(self):
+        try:
+            return self._connectonce()
+        except (FileNotFoundError, ConnectionRefusedError):
+            # no watcher, or a stale socket from a dead one
+            util.tryunlink(self._sockpath)
+        self._spawn()
+        return self._connectonce()
+
+    def _command(self, *args):
+        request = [args[0], self._root] + list(args[1:])
+        try:
+            if self._sock is None:
+                self._firsttime = False
+                self._sock = self._connect()
+            _send(self._sock, request)
+            result = _recv(self._sock)
+        except socket.timeout:
+            raise watchmanclient.Unavailable(b'timed out waiting for response')
+        except (OSError, EOFError, cborutil.CBORDecodeError) as inst:
+            raise watchmanclient.Unavailable(stringutil.forcebytestr(inst))
+        if b'error' in result:
+            raise watchmanclient.Unavailable(result[b'error'])
+        if b'files' in result:
+            result[b'files'] = [_fileentry(*f) for f in result[b'files']]
+        return result
+
+    def command(self, *args):
+        try:
+            return self._command(*args)
+        except watchmanclient.Unavailable:
+            self.clearconnection()
+            raise
+
+
+def shutdown(ui, repo):
+    """stop the watcher of `repo`, return False if none was running"""
+    c = client(ui, repo)
+    try:
+        sock = c._connectonce()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    with sock:
+        _send(sock, [b'shutdown-server', repo.root])
+        _recv(sock)
+    return True
+
@@ -468,6 +468,12 @@ class manifestlog(baselog):
                 t = self.gitrepo[te.id]
         return gitmanifest.gittreemanifestctx(self.gitrepo, t)
 
+    def prefetchdiff(self, node1, node2, match=None):
+        pass
+
+    def write_caches(self):
+        pass
+
 
 @interfaceutil.implementer(repository.ifilestorage)
 class filelog(baselog):
@@ -198,6 +198,19 @@ class gittreemanifest:
 
         return result
 
+    def iterdiff(self, other, match=None, clean=False):
+        if match is None:
+            diff = self.diff(other, clean=clean)
+        else:
+            diff = self.diff(other, match=match, clean=clean)
+        for fn in sorted(diff):
+            value = diff[fn]
+            if value is None:
+                value = self.find(fn)
+                yield fn, value, value
+            else:
+                yield fn, value[0], value[1]
+
     def setflag(self, path, flag):
         node, unused_flag = self._resolve_entry(path)
         self._pending_changes[path] = node, flag
@@ -6,6 +6,7 @@
 # GNU General Public License version 2 or any later version.
 
 
+import collections
 import os
 import struct
 import weakref
@@ -1750,7 +1751,9 @@ class cgpacker:
                 # We can't trust the changed files list in the changeset if the
                 # client requested a shallow clone.
                 if self._isshallow:
-                    changedfiles.update(mfl[c.manifest].read().keys())
+                    # files outside of the matcher are filtered later
+                    mf = mfl[c.manifest].read()
+                    changedfiles.update(mf.walk(self._matcher))
                 else:
                     changedfiles.update(c.files)
             else:
@@ -2378,6 +2381,39 @@ def makestream(
     )
 
 
+def _precompressfilegroups(groups, threads):
+    """compress incoming filelog deltas on a thread pool
+
+    Takes and generates ``(filename, filelog, deltas, compressed)`` tuples.
+
+    The deltas of the next groups are read from the changegroup and
+    compressed by worker threads while the current group is added to its
+    filelog. Adding revisions to the revlogs stays serialized on the calling
+    thread. Compression of deltas that cannot be stored as is, and the search
+    for a better delta base, still happen there too.
+    """
+    # number of groups being compressed ahead of the one being written
+    window = threads * 2
+    pool = pycompat.futures.ThreadPoolExecutor(max_workers=threads)
+    pending = collections.deque()
+    try:
+        for f, fl, deltas, __ in groups:
+            # the whole group has to be read before the next one
+            deltas = list(deltas)
+            job = pool.submit(fl._revlog.compress_deltas, deltas)
+            pending.append((f, fl, deltas, job))
+            if len(pending) > window:
+                f, fl, deltas, job = pending.popleft()
+                yield f, fl, deltas, job.result()
+        while pending:
+            f, fl, deltas, job = pending.popleft()
+            yield f, fl, deltas, job.result()
+    finally:
+        for __, __, __, job in pending:
+            job.cancel()
+        pool.shutdown(wait=True)
+
+
 def _addchangegroupfiles(
     repo,
     source,
@@ -2394,15 +2430,29 @@ def _addchangegroupfiles(
     progress = repo.ui.makeprogress(
         _(b'files'), unit=_(b'files'), total=expectedfiles
     )
-    for chunkdata in iter(source.filelogheader, {}):
+
+    def filegroups():
+        for chunkdata in iter(source.filelogheader, {}):
+            f = chunkdata[b"filename"]
+            yield f, repo.file(f), source.deltaiter(), None
+
+    groups = filegroups()
+    threads = repo.ui.configint(b'experimental', b'changegroup.apply-threads')
+    if (
+        threads > 1
+        and repository.REPO_FEATURE_REVLOG_FILE_STORAGE in repo.features
+    ):
+        groups = _precompressfilegroups(groups, threads)
+
+    for f, fl, deltas, compressed in groups:
         files += 1
-        f = chunkdata[b"filename"]
         repo.ui.debug(b"adding %s revisions\n" % f)
         progress.increment()
-        fl = repo.file(f)
         o = len(fl)
         try:
-            deltas = source.deltaiter()
+            kwargs = {}
+            if compressed is not None:
+                kwargs['compressed_deltas'] = compressed
             added = fl.addgroup(
                 deltas,
                 revmap,
@@ -2410,6 +2460,7 @@ def _addchangegroupfiles(
                 addrevisioncb=addrevisioncb,
                 debug_info=debug_info,
                 delta_base_reuse_policy=delta_base_reuse_policy,
+                **kwargs,
             )
             if not added:
                 raise error.Abort(_(b"received file revlog group is empty"))
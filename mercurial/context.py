@@ -28,6 +28,7 @@ from . import (
     patch,
     pathutil,
     phases,
+    pycompat,
     repoview,
     scmutil,
     sparse,
@@ -38,6 +39,7 @@ from . import (
 )
 from .utils import (
     dateutil,
+    storageutil,
     stringutil,
 )
 from .dirstateutils import (
@@ -46,6 +48,10 @@ from .dirstateutils import (
 
 propertycache = util.propertycache
 
+# below this number of possibly clean files, hashing them on a thread pool is
+# not worth the overhead
+_MIN_THREADED_LOOKUP = 16
+
 
 class basectx:
     """A basectx object represents the common logic for its children:
@@ -112,20 +118,24 @@ class basectx:
         mf1 = other._buildstatusmanifest(s)
         if mf2 is None:
             mf2 = self._buildstatusmanifest(s)
+        if self.rev() is not None and other.rev() is not None:
+            self._repo.manifestlog.prefetchdiff(
+                other.manifestnode(), self.manifestnode(), match
+            )
 
         modified, added = [], []
         removed = []
         clean = []
         deleted, unknown, ignored = s.deleted, s.unknown, s.ignored
         deletedset = set(deleted)
-        d = mf1.diff(mf2, match=match, clean=listclean)
-        for fn, value in d.items():
+        d = mf1.iterdiff(mf2, match=match, clean=listclean)
+        for fn, value1, value2 in d:
             if fn in deletedset:
                 continue
-            if value is None:
+            if value1 == value2:
                 clean.append(fn)
                 continue
-            (node1, flag1), (node2, flag2) = value
+            (node1, flag1), (node2, flag2) = value1, value2
             if node1 is None:
                 added.append(fn)
             elif node2 is None:
@@ -1816,12 +1826,19 @@ class workingctx(committablectx):
         clean = []
         fixup = []
         pctx = self._parents[0]
+        files = sorted(files)
+        hashed = self._hashlookup(files, pctx)
         # do a full compare of any files that might have changed
-        for f in sorted(files):
+        for f in files:
             try:
+                s = None
+                found = hashed.get(f)
+                if found is not None:
+                    # the lstat() of a content hashing to the parent revision
+                    s = found.result()
                 # This will return True for a file that got replaced by a
                 # directory in the interim, but fixing that is pretty hard.
-                if (
+                if s is None and (
                     f not in pctx
                     or self.flags(f) != pctx.flags(f)
                     or pctx[f].cmp(self[f])
@@ -1830,7 +1847,8 @@ class workingctx(committablectx):
                 elif mtime_boundary is None:
                     clean.append(f)
                 else:
-                    s = self[f].lstat()
+                    if s is None:
+                        s = self[f].lstat()
                     mode = s.st_mode
                     size = s.st_size
                     file_mtime = timestamp.reliable_mtime_of(s, mtime_boundary)
@@ -1850,6 +1868,62 @@ class workingctx(committablectx):
 
         return modified, deleted, clean, fixup
 
+    def _hashlookup(self, files, pctx):
+        """hash the content of possibly clean `files` on a thread pool
+
+        Return a {path: future} mapping. A future gives the lstat() of a file
+        whose content hashes to its file revision in `pctx`, and None if it
+        does not or cannot be read. Files missing from the mapping, or whose
+        future gives None, are compared the usual way.
+
+        Reading and hashing the files is the bulk of the work and releases
+        the GIL. Everything touching the dirstate or the stores stays on the
+        calling thread.
+        """
+        threads = self._repo.ui.configint(
+            b'experimental', b'status.lookup-threads'
+        )
+        if (
+            threads <= 1
+            or len(files) < _MIN_THREADED_LOOKUP
+            # the working copy content has to be filtered first
+            or self._repo._encodefilterpats
+        ):
+            return {}
+
+        wvfs = self._repo.wvfs
+
+        def hashfile(f, node, p1, p2):
+            try:
+                if wvfs.islink(f):
+                    data = wvfs.readlink(f)
+                else:
+                    data = wvfs.read(f)
+            except (IOError, OSError):
+                # let the usual comparison deal with it
+                return None
+            # see storageutil.filedataequivalent()
+            if data.startswith(b'\x01\n'):
+                data = b'\x01\n\x01\n' + data
+            if storageutil.hashrevisionsha1(data, p1, p2) != node:
+                return None
+            return wvfs.lstat(f)
+
+        jobs = {}
+        pool = pycompat.futures.ThreadPoolExecutor(max_workers=threads)
+        with pool:
+            for f in files:
+                try:
+                    if f not in pctx or self.flags(f) != pctx.flags(f):
+                        continue
+                    fctx = pctx[f]
+                    node = fctx.filenode()
+                    p1, p2 = fctx.filelog().parents(node)
+                except (IOError, OSError):
+                    continue
+                jobs[f] = pool.submit(hashfile, f, node, p1, p2)
+        return jobs
+
     def _poststatusfixup(self, status, fixup):
         """update dirstate for files that are actually clean"""
         testing.wait_on_cfg(self._repo.ui, b'status.pre-dirstate-write-file')
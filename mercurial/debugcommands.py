@@ -1618,6 +1618,78 @@ def debug_repair_issue6528(ui, repo, **opts):
     )
 
 
+@command(
+    b"debug-redelta",
+    [
+        (
+            b'',
+            b'max-revisions',
+            0,
+            _(b'stop after rewriting this many revisions (0 for no limit)'),
+            _(b'NUM'),
+        ),
+        (
+            b'',
+            b'cold-after',
+            0,
+            _(b'skip revlogs modified in the last NUM changesets'),
+            _(b'NUM'),
+        ),
+        (
+            b'',
+            b'compression-level',
+            b'',
+            _(b'compress the rewritten revisions at this level'),
+            _(b'LEVEL'),
+        ),
+        (
+            b'',
+            b'restart',
+            False,
+            _(b'ignore the progress recorded by a previous run'),
+        ),
+    ],
+)
+def debug_redelta(ui, repo, **opts):
+    """recompute the deltas of the filelogs and manifests
+
+    Unlike `hg debugupgraderepo --optimize re-delta-all`, the repository is
+    rewritten one revlog at a time, each in its own short lock, while the
+    repository stays in use.
+
+    The work can be split between several runs using `--max-revisions`. The
+    progress is recorded in the repository and the next run resumes where
+    the previous one stopped, use `--restart` to start over.
+
+    Revlogs that recently changed are likely to change again soon, use
+    `--cold-after` to only rewrite the ones untouched for a while. With
+    `--compression-level`, the rewritten revisions are compressed harder
+    than the configured level.
+    """
+    if requirements.REVLOGV1_REQUIREMENT not in repo.requirements:
+        msg = _(b"can only re-delta revlogv1 repositories")
+        raise error.Abort(msg)
+
+    level = opts.get('compression_level')
+    if level:
+        try:
+            level = int(level)
+        except ValueError:
+            msg = _(b"invalid compression level: %s")
+            raise error.InputError(msg % level)
+    else:
+        level = None
+
+    rewrite.incremental_redelta(
+        ui,
+        repo,
+        max_revisions=opts['max_revisions'],
+        cold_after=opts['cold_after'],
+        compression_level=level,
+        restart=opts['restart'],
+    )
+
+
 @command(b'debugformat', [] + cmdutil.formatteropts)
 def debugformat(ui, repo, **opts):
     """display format information about the current repository
@@ -3821,6 +3893,45 @@ def debugshell(ui, repo, **opts):
     code.interact(local=imported_objects)
 
 
+@command(
+    b'debug-revlog-read-stats',
+    cmdutil.debugrevlogopts
+    + cmdutil.formatteropts
+    + [(b'r', b'rev', [], _(b'read these revisions only'), _(b'REV'))],
+    _(b'-c|-m|FILE'),
+)
+def debug_revlog_read_stats(ui, repo, file_=None, **opts):
+    """display how the revisions of a revlog are read
+
+    Read all the revisions of the revlog, or the ones given with --rev, and
+    display how the caches behaved, the amount of data read and decompressed
+    and the delta chains restored.
+
+    The revisions are revision numbers of the revlog, not of the changelog.
+
+    To collect these statistics for every revlog read by any command, set
+    `experimental.revlog.read-stats`. They are written with `ui.log` when the
+    command finishes.
+    """
+    opts = pycompat.byteskwargs(opts)
+    store = cmdutil.openstorage(repo, b'debug-revlog-read-stats', file_, opts)
+    revlog = store.get_revlog()
+    if opts[b'rev']:
+        try:
+            revs = [int(r) for r in opts[b'rev']]
+        except ValueError:
+            raise error.InputError(_(b'revisions must be revision numbers'))
+        for rev in revs:
+            if not 0 <= rev < len(revlog):
+                raise error.InputError(_(b'unknown revision: %d') % rev)
+    else:
+        revs = range(len(revlog))
+
+    fm = ui.formatter(b'debug-revlog-read-stats', opts)
+    revlog_debug.debug_read_stats(revlog, fm, revs)
+    fm.end()
+
+
 @command(
     b'debug-revlog-stats',
     [
@@ -53,6 +53,19 @@ _rangemask = dirstatemap.rangemask
 
 DirstateItem = dirstatemap.DirstateItem
 
+# thread pools listing directories during walks, shared by all dirstates
+# {thread-count: executor}
+_walk_pools = {}
+
+
+def _walk_pool(threads):
+    """return the shared thread pool listing directories with `threads`"""
+    pool = _walk_pools.get(threads)
+    if pool is None:
+        pool = pycompat.futures.ThreadPoolExecutor(max_workers=threads)
+        _walk_pools[threads] = pool
+    return pool
+
 
 class repocache(filecache):
     """filecache for files in .hg/"""
@@ -153,12 +166,14 @@ class dirstate:
         nodeconstants,
         use_dirstate_v2,
         use_tracked_hint=False,
+        pattern_cache=None,
     ):
         """Create a new dirstate object.
 
         opener is an open()-like callable that can be used to open the
         dirstate file; root is the root of the directory tracked by
-        the dirstate.
+        the dirstate. pattern_cache is an optional match.patterncache used
+        when building the ignore matcher.
         """
         self._use_dirstate_v2 = use_dirstate_v2
         self._use_tracked_hint = use_tracked_hint
@@ -168,6 +183,7 @@ class dirstate:
         self._root = root
         # Either build a sparse-matcher or None if sparse is disabled
         self._sparsematchfn = sparsematchfn
+        self._patterncache = pattern_cache
         # ntpath.join(root, '') of Python 2.7.9 does not add sep if root is
         # UNC path pointing to root share (issue4557)
         self._rootdir = pathutil.normasprefix(root)
@@ -494,8 +510,13 @@ class dirstate:
             return matchmod.never()
 
         pats = [b'include:%s' % f for f in files]
-        return matchmod.match(self._root, b'', [], pats, warn=self._ui.warn)
-
+        cache = self._patterncache
+        m = matchmod.match(
+            self._root, b'', [], pats, warn=self._ui.warn, cache=cache
+        )
+        if cache is not None:
+            cache.write()
+        return m
     @propertycache
     def _slash(self):
         return self._ui.configbool(b'ui', b'slash') and pycompat.ossep != b'/'
@@ -1424,22 +1445,68 @@ class dirstate:
         work = [d for d in work if not dirignore(d[0])]
 
         # step 2: visit subdirectories
+        visitchildrenset = match.visitchildrenset
+
+        def listdirstat(nd):
+            skip = None
+            if nd != b'':
+                skip = b'.hg'
+            return listdir(join(nd), stat=True, skip=skip)
+
+        readdir = listdirstat
+
+        threads = self._ui.configint(b'experimental', b'dirstate.walk-threads')
+        if threads > 1:
+            # Directories are listed by a thread pool as soon as they are
+            # found, while their entries are still processed one directory
+            # at a time in the usual order on this thread. listdir() and
+            # lstat() release the GIL.
+            pool = _walk_pool(threads)
+            # {directory: (visitchildrenset, listdir-job)}
+            prefetched = {}
+
+            def prefetch(nd):
+                visitentries = match.visitchildrenset(nd)
+                job = None
+                if visitentries:
+                    job = pool.submit(listdirstat, nd)
+                prefetched[nd] = (visitentries, job)
+
+            def visitchildrenset(nd):
+                found = prefetched.get(nd)
+                if found is None:
+                    return match.visitchildrenset(nd)
+                return found[0]
+
+            def readdir(nd):
+                found = prefetched.pop(nd, None)
+                if found is None or found[1] is None:
+                    return listdirstat(nd)
+                return found[1].result()
+
+            for nd, d in work:
+                prefetch(d)
+
         def traverse(work, alreadynormed):
-            wadd = work.append
+            if threads > 1:
+
+                def wadd(nd):
+                    prefetch(nd)
+                    work.append(nd)
+
+            else:
+                wadd = work.append
             while work:
                 tracing.counter('dirstate.walk work', len(work))
                 nd = work.pop()
-                visitentries = match.visitchildrenset(nd)
+                visitentries = visitchildrenset(nd)
                 if not visitentries:
                     continue
                 if visitentries == b'this' or visitentries == b'all':
                     visitentries = None
-                skip = None
-                if nd != b'':
-                    skip = b'.hg'
                 try:
                     with tracing.log('dirstate.walk.traverse listdir %s', nd):
-                        entries = listdir(join(nd), stat=True, skip=skip)
+                        entries = readdir(nd)
                 except (PermissionError, FileNotFoundError) as inst:
                     match.bad(
                         self.pathto(nd), encoding.strtolocal(inst.strerror)
@@ -4,12 +4,15 @@
 # GNU General Public License version 2 or any later version.
 
 
+import os
+
 from .i18n import _
 
 from . import (
     error,
     pathutil,
     policy,
+    pycompat,
     testing,
     txnutil,
     util,
@@ -73,6 +76,11 @@ class _dirstatemapcommon:
             # unknown value, fallback to default
             self._write_mode = WRITE_MODE_AUTO
 
+        # dirstate-v2 data files at least this large are memory-mapped
+        self._mmap_threshold = ui.configbytes(
+            b'experimental', b'mmapdirstatethreshold'
+        )
+
         # for consistent view between _pl() and _read() invocations
         self._pendingmode = None
 
@@ -160,14 +168,27 @@ class _dirstatemapcommon:
                 raise error.CorruptedDirstate(b"dirstate is not in v2 format")
         return self._docket
 
+    def _read_v2_file(self, filename):
+        threshold = self._mmap_threshold
+        # a mapped file cannot be replaced on Windows, and the Rust map does
+        # its own mapping of the data
+        if threshold is None or pycompat.iswindows or rustmod is not None:
+            return self._opener.read(filename)
+        with self._opener(filename) as fp:
+            if os.fstat(fp.fileno()).st_size < threshold:
+                return fp.read()
+            # data files are only ever appended to, never truncated, so the
+            # mapping stays valid
+            return util.mmapread(fp)
+
     def _read_v2_data(self):
         data = None
         attempts = 0
         while attempts < V2_MAX_READ_ATTEMPTS:
             attempts += 1
             try:
-                # TODO: use mmap when possible
-                data = self._opener.read(self.docket.data_filename())
+                data = self._read_v2_file(self.docket.data_filename())
+                break
             except FileNotFoundError:
                 # read race detected between docket and data file
                 # reload the docket and retry
@@ -177,7 +198,7 @@ class _dirstatemapcommon:
             msg = b"dirstate read race happened %d times in a row"
             msg %= attempts
             raise error.Abort(msg)
-        return self._opener.read(self.docket.data_filename())
+        return data
 
     def write_v2_no_append(self, tr, st, meta, packed):
         try:
@@ -376,7 +397,24 @@ class dirstatemap(_dirstatemapcommon):
         if not st:
             return
 
-        # TODO: adjust this estimate for dirstate-v2
+        if self._use_dirstate_v2 and self._docket is not None:
+            # only decode the nodes actually looked up, the whole tree is
+            # parsed on the first operation needing all of it
+            p = self.docket.parents
+            meta = self.docket.tree_metadata
+            self._map, self.copymap = v2.lazy_parse_dirstate(st, meta)
+        else:
+            p = self._parse_v1(st)
+        if not self._dirtyparents:
+            self.setparents(*p)
+
+        # Avoid excess attribute lookups by fast pathing certain checks
+        self.__contains__ = self._map.__contains__
+        self.__getitem__ = self._map.__getitem__
+        self.get = self._map.get
+
+    def _parse_v1(self, st):
+        """parse dirstate-v1 data into the maps, return the parents"""
         if hasattr(parsers, 'dict_new_presized'):
             # Make an estimate of the number of files in the dirstate based on
             # its size. This trades wasting some memory for avoiding costly
@@ -398,28 +436,8 @@ class dirstatemap(_dirstatemapcommon):
         # parsing the dirstate.
         #
         # (we cannot decorate the function directly since it is in a C module)
-        if self._use_dirstate_v2:
-            try:
-                self.docket
-            except error.CorruptedDirstate:
-                # fall back to dirstate-v1 if we fail to parse v2
-                parse_dirstate = util.nogc(parsers.parse_dirstate)
-                p = parse_dirstate(self._map, self.copymap, st)
-            else:
-                p = self.docket.parents
-                meta = self.docket.tree_metadata
-                parse_dirstate = util.nogc(v2.parse_dirstate)
-                parse_dirstate(self._map, self.copymap, st, meta)
-        else:
-            parse_dirstate = util.nogc(parsers.parse_dirstate)
-            p = parse_dirstate(self._map, self.copymap, st)
-        if not self._dirtyparents:
-            self.setparents(*p)
-
-        # Avoid excess attribute lookups by fast pathing certain checks
-        self.__contains__ = self._map.__contains__
-        self.__getitem__ = self._map.__getitem__
-        self.get = self._map.get
+        parse_dirstate = util.nogc(parsers.parse_dirstate)
+        return parse_dirstate(self._map, self.copymap, st)
 
     def write(self, tr, st):
         if self._use_dirstate_v2:
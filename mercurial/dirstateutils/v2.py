@@ -124,6 +124,204 @@ def slice_with_len(data, start, len):
     return data[start : start + len]
 
 
+class _lazytree:
+    """on-demand access to the nodes of a dirstate-v2 tree
+
+    Sibling nodes are sorted by path, so the node of a given path is found
+    with a binary search of the children of each of its ancestors, without
+    decoding any other node.
+    """
+
+    def __init__(self, data, tree_metadata):
+        self._data = data
+        (
+            self._root_nodes_start,
+            self._root_nodes_len,
+            _nodes_with_entry_count,
+            _nodes_with_copy_source_count,
+            _unreachable_bytes,
+            _unused,
+            _ignore_patterns_hash,
+        ) = TREE_METADATA.unpack(tree_metadata)
+        # (entries, copies) of the whole tree, once parsed
+        self._parsed = None
+
+    def parse_all(self):
+        """return the ({path: entry}, {path: copy-source}) of the whole tree"""
+        if self._parsed is None:
+            entries = {}
+            copies = {}
+            parse_nodes(
+                entries,
+                copies,
+                self._data,
+                self._root_nodes_start,
+                self._root_nodes_len,
+            )
+            self._parsed = (entries, copies)
+        return self._parsed
+
+    def _search(self, start, count, path):
+        """return the unpacked node for `path` among `count` siblings"""
+        data = self._data
+        lo = 0
+        hi = count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            node = NODE.unpack_from(data, start + NODE_SIZE * mid)
+            node_path = slice_with_len(data, node[0], node[1])
+            if node_path < path:
+                lo = mid + 1
+            elif node_path > path:
+                hi = mid
+            else:
+                return node
+        return None
+
+    def find(self, path):
+        """return the (entry, copy-source) of a tracked `path` or None"""
+        start = self._root_nodes_start
+        count = self._root_nodes_len
+        end = -1
+        while True:
+            end = path.find(b'/', end + 1)
+            if end < 0:
+                node = self._search(start, count, path)
+                break
+            node = self._search(start, count, path[:end])
+            if node is None:
+                return None
+            start = node[5]
+            count = node[6]
+        if node is None:
+            return None
+        flags, size, mtime_s, mtime_ns = node[9:]
+        item = parsers.DirstateItem.from_v2_data(flags, size, mtime_s, mtime_ns)
+        if not item.any_tracked:
+            return None
+        copy_source = None
+        if node[3]:
+            copy_source = slice_with_len(self._data, node[3], node[4])
+        return item, copy_source
+
+
+class _lazymap(dict):
+    """a dict filled from a dirstate-v2 tree on demand
+
+    Looking a path up only decodes the nodes leading to it. Any other
+    operation parses the whole tree first, after which this behaves as a
+    regular dict. Values already looked up are kept as is, so that the
+    objects handed out stay the ones in the map.
+    """
+
+    def __init__(self, tree):
+        super().__init__()
+        self._tree = tree
+        # paths known to be missing from the tree
+        self._missing = set()
+
+    def _value(self, found):
+        raise NotImplementedError
+
+    def _fromtree(self, parsed):
+        raise NotImplementedError
+
+    def _lookup(self, key):
+        """look `key` up in the tree, return True if it was found"""
+        if dict.__contains__(self, key):
+            return True
+        if self._tree is None or key in self._missing:
+            return False
+        found = self._tree.find(key)
+        value = None
+        if found is not None:
+            value = self._value(found)
+        if value is None:
+            self._missing.add(key)
+            return False
+        dict.__setitem__(self, key, value)
+        return True
+
+    def _load(self):
+        tree = self._tree
+        if tree is not None:
+            self._tree = None
+            self._missing = None
+            for key, value in self._fromtree(tree.parse_all()).items():
+                dict.setdefault(self, key, value)
+
+    def __contains__(self, key):
+        return self._lookup(key)
+
+    def __getitem__(self, key):
+        if self._tree is not None:
+            self._lookup(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if self._lookup(key):
+            return dict.__getitem__(self, key)
+        return default
+
+    def _loaded(name):
+        def method(self, *args, **kwargs):
+            self._load()
+            return getattr(dict, name)(self, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+    __iter__ = _loaded('__iter__')
+    __len__ = _loaded('__len__')
+    __eq__ = _loaded('__eq__')
+    __ne__ = _loaded('__ne__')
+    __repr__ = _loaded('__repr__')
+    __setitem__ = _loaded('__setitem__')
+    __delitem__ = _loaded('__delitem__')
+    keys = _loaded('keys')
+    values = _loaded('values')
+    items = _loaded('items')
+    pop = _loaded('pop')
+    popitem = _loaded('popitem')
+    setdefault = _loaded('setdefault')
+    update = _loaded('update')
+    clear = _loaded('clear')
+    copy = _loaded('copy')
+    del _loaded
+
+    __hash__ = None
+
+
+class lazyentrymap(_lazymap):
+    """{path: DirstateItem} mapping of a dirstate-v2 tree, decoded lazily"""
+
+    def _value(self, found):
+        return found[0]
+
+    def _fromtree(self, parsed):
+        return parsed[0]
+
+
+class lazycopymap(_lazymap):
+    """{path: copy-source} mapping of a dirstate-v2 tree, decoded lazily"""
+
+    def _value(self, found):
+        return found[1]
+
+    def _fromtree(self, parsed):
+        return parsed[1]
+
+
+def lazy_parse_dirstate(data, tree_metadata):
+    """return the (map, copy_map) of a v2-dirstate, decoded on demand
+
+    This is a lazy version of parse_dirstate(): `data` is typically a memory
+    mapping of the data file and nodes are only decoded when looked up.
+    """
+    tree = _lazytree(data, tree_metadata)
+    return lazyentrymap(tree), lazycopymap(tree)
+
+
 @attr.s
 class Node:
     path = attr.ib()
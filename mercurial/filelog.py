@@ -34,6 +34,7 @@ class filelog:
             censorable=True,
             canonical_parent_order=False,  # see comment in revlog.py
             try_split=try_split,
+            persistentnodemap=b'persistent-nodemap.filelogs' in opener.options,
         )
         # Full name of the user visible file, relative to the repository root.
         # Used by LFS.
@@ -110,6 +111,12 @@ class filelog:
     def revision(self, node):
         return self._revlog.revision(node)
 
+    # Restore many revisions at once, see revlog.revisions()
+    def revisions(self, nodes):
+        rl = self._revlog
+        for rev, text in rl.revisions(rl.rev(n) for n in nodes):
+            yield rl.node(rev), text
+
     def rawdata(self, node):
         return self._revlog.rawdata(node)
 
@@ -165,6 +172,7 @@ class filelog:
         maybemissingparents=False,
         debug_info=None,
         delta_base_reuse_policy=None,
+        compressed_deltas=None,
     ):
         if maybemissingparents:
             raise error.Abort(
@@ -187,6 +195,7 @@ class filelog:
                 duplicaterevisioncb=duplicaterevisioncb,
                 debug_info=debug_info,
                 delta_base_reuse_policy=delta_base_reuse_policy,
+                compressed_deltas=compressed_deltas,
             )
 
     def getstrippoint(self, minlink):
@@ -60,6 +60,8 @@ CACHE_FULL_MANIFEST = b"full-manifest"
 CACHE_FILE_NODE_TAGS = b"file-node-tags"
 # Warm internal manifestlog cache (eg: persistent nodemap)
 CACHE_MANIFESTLOG_CACHE = b"manifestlog-cache"
+# Warm internal filelog cache (eg: persistent nodemap)
+CACHE_FILELOG_CACHE = b"filelog-cache"
 # Warn rev branch cache
 CACHE_REV_BRANCH = b"rev-branch-cache"
 # Warm tags' cache for default repoview'
@@ -79,6 +81,7 @@ CACHES_ALL = {
     CACHE_BRANCHMAP_SERVED,
     CACHE_BRANCHMAP_ALL,
     CACHE_CHANGELOG_CACHE,
+    CACHE_FILELOG_CACHE,
     CACHE_FILE_NODE_TAGS,
     CACHE_FULL_MANIFEST,
     CACHE_MANIFESTLOG_CACHE,
@@ -1082,6 +1085,18 @@ class imanifestdict(interfaceutil.Interface):
         are the same for the other manifest.
         """
 
+    def iterdiff(other, match=None, clean=False):
+        """Generate the differences between this manifest and another.
+
+        This is a lazy version of ``diff()``: items are generated in path
+        order, as ``(path, (node1, flag1), (node2, flag2))`` tuples. Unchanged
+        files are generated when ``clean`` is True, with both values being
+        equal.
+
+        Entries the matcher cannot reach should be skipped without being
+        loaded, and consumers are free to stop the iteration early.
+        """
+
     def setflag(path, flag):
         """Set the flag value for a given path.
 
@@ -1472,6 +1487,16 @@ class imanifestlog(interfaceutil.Interface):
     def update_caches(transaction):
         """update whatever cache are relevant for the used storage."""
 
+    def prefetchdiff(node1, node2, match=None):
+        """Prepare the storage for a diff between two root manifests.
+
+        ``match`` restricts the files the diff will look at. This is only a
+        hint, implementations are free to do nothing.
+        """
+
+    def write_caches():
+        """persist the caches shared with other processes."""
+
 
 class ilocalrepositoryfilestorage(interfaceutil.Interface):
     """Local repository sub-interface providing access to tracked file storage.
@@ -90,7 +90,10 @@ from .utils import (
 from .revlogutils import (
     concurrency_checker as revlogchecker,
     constants as revlogconst,
+    fulltextcache,
+    readstats,
     sidedata as sidedatamod,
+    snapshotcache,
 )
 
 release = lockmod.release
@@ -794,6 +797,24 @@ def makelocalrepository(baseui, path: bytes, intents=None):
     wcachevfs = vfsmod.vfs(wcachepath, cacheaudited=True)
     wcachevfs.createmode = store.createmode
 
+    fulltext_cache_size = ui.configbytes(
+        b'experimental', b'revlog.fulltext-cache.max-size'
+    )
+    if fulltext_cache_size > 0:
+        min_chain = ui.configint(
+            b'experimental', b'revlog.fulltext-cache.min-chain-length'
+        )
+        storevfs.options[b'fulltext-cache'] = fulltextcache.fulltextcache(
+            cachevfs, fulltext_cache_size, min_chain
+        )
+    if ui.configbool(b'experimental', b'revlog.persistent-snapshot-cache'):
+        snapshots = snapshotcache.persistentsnapshotcache(cachevfs)
+        storevfs.options[b'persistent-snapshot-cache'] = snapshots
+    if ui.configbool(b'experimental', b'revlog.read-stats'):
+        read_stats = readstats.readstatsregistry()
+        storevfs.options[b'revlog-read-stats'] = read_stats
+        ui.atexit(read_stats.log, ui)
+
     # Now resolve the type for the repository object. We do this by repeatedly
     # calling a factory function to produces types for specific aspects of the
     # repo's operation. The aggregate returned types are used as base classes
@@ -950,6 +971,9 @@ def gathersupportedrequirements(ui):
             supported.add(b'exp-compression-%s' % name)
             if engine.name() == b'zstd':
                 supported.add(requirementsmod.REVLOG_COMPRESSION_ZSTD)
+                supported.add(
+                    requirementsmod.REVLOG_ZSTD_DICTIONARY_REQUIREMENT
+                )
 
     return supported
 
@@ -1038,6 +1062,19 @@ def resolvestorevfsoptions(ui, requirements, features):
     if manifestcachesize is not None:
         options[b'manifestcachesize'] = manifestcachesize
 
+    # experimental config: experimental.manifest.shared-cache.max-size
+    sharedcachesize = ui.configbytes(
+        b'experimental', b'manifest.shared-cache.max-size'
+    )
+    if sharedcachesize > 0:
+        options[b'manifest-shared-cache-size'] = sharedcachesize
+
+    if requirementsmod.TREEMANIFEST_REQUIREMENT in requirements:
+        subtreecachesize = ui.configint(
+            b'experimental', b'treemanifest.subtree-cache-size'
+        )
+        options[b'manifest-subtree-cache-size'] = subtreecachesize
+
     # In the absence of another requirement superseding a revlog-related
     # requirement, we have to assume the repo is using revlog version 0.
     # This revlog format is super old and we don't bother trying to parse
@@ -1099,6 +1136,12 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
         data_config.uncompressed_cache_factor = factor
         data_config.uncompressed_cache_count = count
 
+    decompression_threads = ui.configint(
+        b'experimental', b'revlog.decompression-threads'
+    )
+    if decompression_threads is not None and decompression_threads > 1:
+        data_config.decompression_threads = decompression_threads
+
     delta_config.delta_both_parents = ui.configbool(
         b'storage', b'revlog.optimize-delta-parent-choice'
     )
@@ -1129,6 +1172,9 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
     mmapindexthreshold = ui.configbytes(b'experimental', b'mmapindexthreshold')
     if mmapindexthreshold is not None:
         data_config.mmap_index_threshold = mmapindexthreshold
+    mmapdatathreshold = ui.configbytes(b'experimental', b'mmapdatathreshold')
+    if mmapdatathreshold is not None:
+        data_config.mmap_data_threshold = mmapdatathreshold
 
     withsparseread = ui.configbool(b'experimental', b'sparse-read')
     srdensitythres = float(
@@ -1174,6 +1220,8 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
             msg = _(b'invalid value for `storage.revlog.zstd.level` config: %d')
             raise error.Abort(msg % zstd_level)
     feature_config.compression_engine_options[b'zstd.level'] = zstd_level
+    if requirementsmod.REVLOG_ZSTD_DICTIONARY_REQUIREMENT in requirements:
+        options[b'zstd-dictionary'] = True
 
     if requirementsmod.NARROW_REQUIREMENT in requirements:
         feature_config.enable_ellipsis = True
@@ -1215,6 +1263,10 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
             if slow_path == b'abort':
                 raise error.Abort(msg, hint=hint)
         options[b'persistent-nodemap'] = True
+        if ui.configbool(b'storage', b'revlog.persistent-nodemap.filelogs'):
+            options[b'persistent-nodemap.filelogs'] = ui.configint(
+                b'storage', b'revlog.persistent-nodemap.filelogs.min-revisions'
+            )
     if requirementsmod.DIRSTATE_V2_REQUIREMENT in requirements:
         slow_path = ui.config(b'storage', b'dirstate-v2.slow-path')
         if slow_path not in (b'allow', b'warn', b'abort'):
@@ -1514,6 +1566,13 @@ class localrepository:
         self._sparsesignaturecache = {}
         # Signature to cached matcher instance.
         self._sparsematchercache = {}
+        # Parsed pattern files and regexps for the matchers of the dirstate
+        # and of sparse, None if disabled.
+        self._patterncache = None
+        if ui.configbool(b'experimental', b'pattern-cache'):
+            self._patterncache = matchmod.patterncache(
+                self.cachevfs, b'patterns'
+            )
 
         self._extrafilterid = repoview.extrafilter(ui)
 
@@ -1612,6 +1671,10 @@ class localrepository:
     def _writecaches(self):
         if self._revbranchcache:
             self._revbranchcache.write()
+        # only persist the manifest caches of a manifestlog actually loaded
+        mfl = vars(self.unfiltered()).get('manifestlog')
+        if mfl is not None:
+            mfl.write_caches()
 
     def _restrictcapabilities(self, caps):
         if self.ui.configbool(b'experimental', b'bundle2-advertise'):
@@ -1826,6 +1889,7 @@ class localrepository:
             self.nodeconstants,
             use_dirstate_v2,
             use_tracked_hint=use_tracked_hint,
+            pattern_cache=self._patterncache,
         )
 
     def _dirstatevalidate(self, node):
@@ -2957,6 +3021,14 @@ class localrepository:
                 if manifestrevlog is not None:
                     manifestrevlog.update_caches(transaction=tr)
 
+        if repository.CACHE_FILELOG_CACHE in caches:
+            if b'persistent-nodemap.filelogs' in self.svfs.options:
+                for entry in self.store.data_entries():
+                    if not (entry.is_revlog and entry.is_filelog):
+                        continue
+                    filerevlog = entry.get_revlog_instance(self).get_revlog()
+                    filerevlog.update_caches(transaction=tr)
+
         if repository.CACHE_REV_BRANCH in caches:
             rbc = unfi.revbranchcache()
             for r in unfi.changelog:
@@ -3734,6 +3806,9 @@ def newreporequirements(ui, createopts):
     # zlib is the historical default and doesn't need an explicit requirement.
     if compengine == b'zstd':
         requirements.add(b'revlog-compression-zstd')
+        # experimental config: format.exp-revlog-zstd-dictionary
+        if ui.configbool(b'format', b'exp-revlog-zstd-dictionary'):
+            requirements.add(requirementsmod.REVLOG_ZSTD_DICTIONARY_REQUIREMENT)
     elif compengine != b'zlib':
         requirements.add(b'exp-compression-%s' % compengine)
 
@@ -472,6 +472,32 @@ except AttributeError:
 
 
 @interfaceutil.implementer(repository.imanifestdict)
+def _mergediffentries(entries1, entries2, clean):
+    """generate the diff of two sorted iterables of (path, node, flags)
+
+    See manifestdict.iterdiff() for the format of the generated items.
+    """
+    absent = (None, b'')
+    entries1 = iter(entries1)
+    entries2 = iter(entries2)
+    e1 = next(entries1, None)
+    e2 = next(entries2, None)
+    while e1 is not None or e2 is not None:
+        if e2 is None or (e1 is not None and e1[0] < e2[0]):
+            yield e1[0], e1[1:], absent
+            e1 = next(entries1, None)
+        elif e1 is None or e2[0] < e1[0]:
+            yield e2[0], absent, e2[1:]
+            e2 = next(entries2, None)
+        else:
+            v1 = e1[1:]
+            v2 = e2[1:]
+            if clean or v1 != v2:
+                yield e1[0], v1, v2
+            e1 = next(entries1, None)
+            e2 = next(entries2, None)
+
+
 class manifestdict:
     def __init__(self, nodelen, data=b''):
         self._nodelen = nodelen
@@ -615,6 +641,44 @@ class manifestdict:
             return m1.diff(m2, clean=clean)
         return self._lm.diff(m2._lm, clean)
 
+    def iterdiff(self, m2, match=None, clean=False):
+        """Generates the changes between the current manifest and m2.
+
+        Items are ``(path, (n1, fl1), (n2, fl2))`` tuples generated in path
+        order, with the same conventions as the values returned by diff().
+        Unchanged files are only generated if `clean` is True, with both
+        sides being equal.
+
+        Unlike diff(), filtering by `match` does not copy the manifests and
+        the changes are computed as they are consumed, so that callers can
+        stop early.
+        """
+        if match is not None and match.always():
+            match = None
+        lm1 = self._lm
+        lm2 = m2._lm
+        if match is None:
+            # the lazymanifest computes a complete diff much faster
+            diff = lm1.diff(lm2, clean)
+            for fn in sorted(diff):
+                value = diff[fn]
+                if value is None:
+                    value = lm1[fn]
+                    yield fn, value, value
+                else:
+                    yield fn, value[0], value[1]
+            return
+
+        if self._filesfastpath(match) and m2._filesfastpath(match):
+            files = sorted(set(match.files()))
+            entries1 = ((fn,) + lm1[fn] for fn in files if fn in lm1)
+            entries2 = ((fn,) + lm2[fn] for fn in files if fn in lm2)
+        else:
+            entries1 = (e for e in lm1.iterentries() if match(e[0]))
+            entries2 = (e for e in lm2.iterentries() if match(e[0]))
+        for item in _mergediffentries(entries1, entries2, clean):
+            yield item
+
     def setflag(self, key, flag):
         if flag not in _manifestflags:
             raise TypeError(b"Invalid manifest flag set.")
@@ -1274,51 +1338,91 @@ class treemanifest:
         the nodeid will be None and the flags will be the empty
         string.
         """
-        if match and not match.always():
-            m1 = self._matches(match)
-            m2 = m2._matches(match)
-            return m1.diff(m2, clean=clean)
         result = {}
-        emptytree = treemanifest(self.nodeconstants)
+        for fn, value1, value2 in self.iterdiff(m2, match=match, clean=clean):
+            if value1 == value2:
+                result[fn] = None
+            else:
+                result[fn] = (value1, value2)
+        return result
 
-        def _iterativediff(t1, t2, stack):
-            """compares two tree manifests and append new tree-manifests which
-            needs to be compared to stack"""
-            if t1._node == t2._node and not t1._dirty and not t2._dirty:
+    def iterdiff(self, m2, match=None, clean=False):
+        """Generates the changes between the current manifest and m2.
+
+        See manifestdict.iterdiff() for the format of the generated items.
+
+        Directories with the same node on both sides are skipped (unless
+        `clean` is True) and directories `match` cannot reach are never
+        loaded.
+        """
+        if match is not None and match.always():
+            match = None
+        return self._iterdiff(m2, match, clean)
+
+    def _iterdiff(self, m2, match, clean):
+        t1 = self
+        t2 = m2
+        if (
+            not clean
+            and t1._node == t2._node
+            and not t1._dirty
+            and not t2._dirty
+        ):
+            return
+        visit = None
+        if match is not None:
+            visit = match.visitchildrenset(t1._dir[:-1])
+            if not visit:
                 return
-            t1._load()
-            t2._load()
-            self._loaddifflazy(t1, t2)
+            if visit == b'all':
+                match = None
+            if visit == b'all' or visit == b'this':
+                visit = None
+        t1._load()
+        t2._load()
+
+        names = set(t1._files)
+        names.update(t2._files)
+        names.update(t1._dirs)
+        names.update(t1._lazydirs)
+        names.update(t2._dirs)
+        names.update(t2._lazydirs)
+        absent = (None, b'')
+        for name in sorted(names):
+            if name[-1:] == b'/':
+                if visit is not None and name[:-1] not in visit:
+                    continue
+                if not clean:
+                    # compare the nodes before loading lazy directories
+                    lazy1 = t1._lazydirs.get(name)
+                    lazy2 = t2._lazydirs.get(name)
+                    if lazy1 and lazy2 and lazy1[0] == lazy2[0]:
+                        continue
+                t1._loadlazy(name)
+                t2._loadlazy(name)
+                sub1 = t1._dirs.get(name)
+                sub2 = t2._dirs.get(name)
+                if sub1 is None:
+                    sub1 = treemanifest(self.nodeconstants, t2._subpath(name))
+                elif sub2 is None:
+                    sub2 = treemanifest(self.nodeconstants, t1._subpath(name))
+                for item in sub1._iterdiff(sub2, match, clean):
+                    yield item
+                continue
 
-            for d, m1 in t1._dirs.items():
-                m2 = t2._dirs.get(d, emptytree)
-                stack.append((m1, m2))
-
-            for d, m2 in t2._dirs.items():
-                if d not in t1._dirs:
-                    stack.append((emptytree, m2))
-
-            for fn, n1 in t1._files.items():
-                fl1 = t1._flags.get(fn, b'')
-                n2 = t2._files.get(fn, None)
-                fl2 = t2._flags.get(fn, b'')
-                if n1 != n2 or fl1 != fl2:
-                    result[t1._subpath(fn)] = ((n1, fl1), (n2, fl2))
-                elif clean:
-                    result[t1._subpath(fn)] = None
-
-            for fn, n2 in t2._files.items():
-                if fn not in t1._files:
-                    fl2 = t2._flags.get(fn, b'')
-                    result[t2._subpath(fn)] = ((None, b''), (n2, fl2))
-
-        stackls = []
-        _iterativediff(self, m2, stackls)
-        while stackls:
-            t1, t2 = stackls.pop()
-            # stackls is populated in the function call
-            _iterativediff(t1, t2, stackls)
-        return result
+            # While visitchildrenset *usually* lists only subdirs, this is
+            # actually up to the matcher and may have some files in the set().
+            if visit is not None and name not in visit:
+                continue
+            fullp = t1._subpath(name)
+            if match is not None and not match(fullp):
+                continue
+            n1 = t1._files.get(name)
+            n2 = t2._files.get(name)
+            value1 = absent if n1 is None else (n1, t1._flags.get(name, b''))
+            value2 = absent if n2 is None else (n2, t2._flags.get(name, b''))
+            if clean or value1 != value2:
+                yield fullp, value1, value2
 
     def unmodifiedsince(self, m2):
         return not self._dirty and not m2._dirty and self._node == m2._node
@@ -1539,6 +1643,158 @@ class manifestfulltextcache(util.lrucachedict):
         self._read = False
 
 
+class manifestsubtreecache(manifestfulltextcache):
+    """File-backed LRU cache of the texts of tree manifest directories
+
+    Entries are keyed by the node of the directory manifest, which identifies
+    its content whatever the directory it belongs to. The file format is the
+    one of `manifestfulltextcache`.
+    """
+
+    _file = b'manifestsubtreecache'
+
+
+class manifestsharedcache:
+    """Byte-bounded cache of manifest fulltexts shared between processes
+
+    The cache is a single file that readers memory-map: all the processes of
+    a host (hgweb and ssh server workers, chg workers, ...) share the same
+    pages and look entries up without parsing the file. The file is only
+    ever replaced atomically, so a reader keeps a consistent view.
+
+    Fulltexts read or added by a process are written out in a new version of
+    the file, together with the previous entries, from the most to the least
+    recently written, until the size limit is reached.
+
+    File format:
+
+    - 4 bytes number of entries,
+    - the index: for each entry, 20 bytes node, 8 bytes offset of the data
+      in the file and 4 bytes length, sorted by node,
+    - the data of the entries, from the most to the least recently written.
+    """
+
+    _file = b'manifestsharedcache'
+    _header = struct.Struct(b'>I')
+    _entry = struct.Struct(b'>20sQI')
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._opener = None
+        self._data = None
+        self._count = 0
+        # fulltexts to write, in the order they were added
+        self._pending = {}
+
+    def _readfile(self):
+        """return (data, entry count) of the current version of the file"""
+        if self._opener is None:
+            return b'', 0
+        try:
+            with self._opener(self._file) as fp:
+                data = util.mmapread(fp)
+        except (IOError, OSError):
+            # the file is allowed to be missing
+            return b'', 0
+        if len(data) < self._header.size:
+            return b'', 0
+        count = self._header.unpack_from(data)[0]
+        if self._header.size + count * self._entry.size > len(data):
+            # this is a cache, corruption is skipped
+            return b'', 0
+        return data, count
+
+    def _entries(self, data, count):
+        """generate the (node, offset, length) entries of the index"""
+        entry = self._entry
+        for idx in range(count):
+            yield entry.unpack_from(data, self._header.size + idx * entry.size)
+
+    def get(self, node):
+        """return the cached fulltext of `node` or None"""
+        text = self._pending.get(node)
+        if text is not None:
+            return text
+        if self._data is None:
+            self._data, self._count = self._readfile()
+        data = self._data
+        entry = self._entry
+        base = self._header.size
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            n, offset, length = entry.unpack_from(data, base + mid * entry.size)
+            if n < node:
+                lo = mid + 1
+            elif n > node:
+                hi = mid
+            else:
+                if offset + length > len(data):
+                    return None
+                return data[offset : offset + length]
+        return None
+
+    def add(self, node, text):
+        """record the fulltext of `node` to be written in the cache"""
+        if len(text) > self.maxsize:
+            return
+        self._pending.pop(node, None)
+        self._pending[node] = bytes(text)
+
+    def write(self):
+        """write a new version of the cache including the pending entries"""
+        if not self._pending or self._opener is None:
+            return
+        # start from the current file, other processes may have written it
+        data, count = self._readfile()
+        entries = []
+        size = 0
+        for node in reversed(self._pending):
+            text = self._pending[node]
+            if size + len(text) > self.maxsize:
+                continue
+            entries.append((node, text))
+            size += len(text)
+        seen = set(self._pending)
+        old = sorted(self._entries(data, count), key=lambda e: e[1])
+        for node, offset, length in old:
+            if node in seen or size + length > self.maxsize:
+                continue
+            if offset + length > len(data):
+                continue
+            entries.append((node, data[offset : offset + length]))
+            seen.add(node)
+            size += length
+
+        offsets = {}
+        offset = self._header.size + len(entries) * self._entry.size
+        for node, text in entries:
+            offsets[node] = offset
+            offset += len(text)
+        try:
+            with self._opener(
+                self._file, b'w', atomictemp=True, checkambig=True
+            ) as fp:
+                fp.write(self._header.pack(len(entries)))
+                for node, text in sorted(entries, key=lambda e: e[0]):
+                    fp.write(self._entry.pack(node, offsets[node], len(text)))
+                for node, text in entries:
+                    fp.write(text)
+        except (IOError, OSError):
+            # this is a cache, failing to write it is fine
+            pass
+        self._pending = {}
+        self._data = None
+
+    def clear(self, clear_persisted_data=False):
+        self._pending = {}
+        self._data = None
+        self._count = 0
+        if clear_persisted_data and self._opener is not None:
+            self._opener.tryunlink(self._file)
+
+
 # and upper bound of what we expect from compression
 # (real live value seems to be "3")
 MAXCOMPRESSION = 3
@@ -1577,15 +1833,20 @@ class manifestrevlog:
         # revs at a time (such as during commit --amend). When rebasing large
         # stacks of commits, the number can go up, hence the config knob below.
         cachesize = 4
+        sharedcachesize = 0
         optiontreemanifest = False
         opts = getattr(opener, 'options', None)
         if opts is not None:
             cachesize = opts.get(b'manifestcachesize', cachesize)
+            sharedcachesize = opts.get(b'manifest-shared-cache-size', 0)
             optiontreemanifest = opts.get(b'treemanifest', False)
 
         self._treeondisk = optiontreemanifest or treemanifest
 
         self._fulltextcache = manifestfulltextcache(cachesize)
+        self._sharedcache = None
+        if sharedcachesize > 0 and not tree:
+            self._sharedcache = manifestsharedcache(sharedcachesize)
 
         if tree:
             assert self._treeondisk, (tree, b'opts is %r' % opts)
@@ -1630,6 +1891,8 @@ class manifestrevlog:
             return
 
         self._fulltextcache._opener = repo.wcachevfs
+        if self._sharedcache is not None:
+            self._sharedcache._opener = repo.cachevfs
         if repo._currentlock(repo._wlockref) is None:
             return
 
@@ -1649,6 +1912,8 @@ class manifestrevlog:
                 # there's a different manifest in play now, abort
                 return
             self._fulltextcache.write()
+            if self._sharedcache is not None:
+                self._sharedcache.write()
 
         repo._afterlock(persistmanifestcache)
 
@@ -1656,9 +1921,22 @@ class manifestrevlog:
     def fulltextcache(self):
         return self._fulltextcache
 
+    def _readrevision(self, node):
+        """return the fulltext of `node`, using the shared cache if any"""
+        shared = self._sharedcache
+        if shared is None:
+            return self.revision(node)
+        text = shared.get(node)
+        if text is None:
+            text = self.revision(node)
+            shared.add(node, text)
+        return text
+
     def clearcaches(self, clear_persisted_data=False):
         self._revlog.clearcaches()
         self._fulltextcache.clear(clear_persisted_data=clear_persisted_data)
+        if self._sharedcache is not None:
+            self._sharedcache.clear(clear_persisted_data=clear_persisted_data)
         self._dirlogcache = {self.tree: self}
 
     def dirlog(self, d):
@@ -1748,6 +2026,8 @@ class manifestrevlog:
 
         if arraytext is not None:
             self.fulltextcache[n] = arraytext
+            if self._sharedcache is not None:
+                self._sharedcache.add(n, arraytext)
 
         return n
 
@@ -1823,6 +2103,12 @@ class manifestrevlog:
     def revision(self, node):
         return self._revlog.revision(node)
 
+    # Restore many revisions at once, see revlog.revisions()
+    def revisions(self, nodes):
+        rl = self._revlog
+        for rev, text in rl.revisions(rl.rev(n) for n in nodes):
+            yield rl.node(rev), text
+
     def rawdata(self, node):
         return self._revlog.rawdata(node)
 
@@ -1934,14 +2220,25 @@ class manifestlog:
         self.nodeconstants = repo.nodeconstants
         usetreemanifest = False
         cachesize = 4
+        subtreecachesize = 0
 
         opts = getattr(opener, 'options', None)
         if opts is not None:
             usetreemanifest = opts.get(b'treemanifest', usetreemanifest)
             cachesize = opts.get(b'manifestcachesize', cachesize)
+            subtreecachesize = opts.get(
+                b'manifest-subtree-cache-size', subtreecachesize
+            )
 
         self._treemanifests = usetreemanifest
 
+        # A cache of the text of the directory manifests, for all directories
+        self._subtreecache = None
+        if usetreemanifest and subtreecachesize > 0:
+            self._subtreecache = manifestsubtreecache(subtreecachesize)
+            if hasattr(repo, 'cachevfs'):
+                self._subtreecache._opener = repo.cachevfs
+
         self._rootstore = rootstore
         self._rootstore._setupmanifestcachehooks(repo)
         self._narrowmatch = narrowmatch
@@ -2008,8 +2305,99 @@ class manifestlog:
     def getstorage(self, tree):
         return self._rootstore.dirlog(tree)
 
+    def _readdirtext(self, store, node):
+        """return the text of the directory manifest `node` of `store`"""
+        cache = self._subtreecache
+        if cache is None:
+            return store.revision(node)
+        text = cache.get(node)
+        if text is not None:
+            return bytes(text)
+        text = store.revision(node)
+        cache[node] = bytearray(text)
+        return text
+
+    def _subdirs(self, node):
+        """return the {subdir: node} mapping of a cached directory manifest"""
+        text = None
+        if node != self.nodeconstants.nullid:
+            text = self._subtreecache.get(node)
+        if text is None:
+            return {}
+        subdirs = {}
+        for f, n, fl in _parse(self.nodeconstants.nodelen, bytes(text)):
+            if fl == b't':
+                subdirs[f + b'/'] = n
+        return subdirs
+
+    def prefetchdiff(self, node1, node2, match=None):
+        """read the directory manifests a diff between two root manifests
+        will need
+
+        Only the directories whose node differ between both sides and that
+        `match` can reach are read. The tree is walked one level at a time
+        and the directory manifests of each level are restored with one
+        batched read per directory revlog.
+        """
+        cache = self._subtreecache
+        if cache is None:
+            return
+        nullid = self.nodeconstants.nullid
+        narrowmatch = self._narrowmatch
+        # do not read more than the cache can keep
+        budget = cache.capacity
+        level = [(b'', node1, node2)]
+        while level and budget > 0:
+            missing = {}
+            for d, n1, n2 in level:
+                for n in (n1, n2):
+                    if n != nullid and n not in cache:
+                        missing.setdefault(d, set()).add(n)
+            for d, nodes in sorted(missing.items()):
+                store = self.getstorage(d)
+                revs = []
+                for n in nodes:
+                    try:
+                        revs.append(store.rev(n))
+                    except error.LookupError:
+                        # trees missing on disk are left to the regular read
+                        pass
+                nodes = [store.node(r) for r in sorted(revs)[:budget]]
+                for n, text in store.revisions(nodes):
+                    cache[n] = bytearray(text)
+                    budget -= 1
+                if budget <= 0:
+                    break
+
+            nextlevel = []
+            for d, n1, n2 in level:
+                subdirs1 = self._subdirs(n1)
+                subdirs2 = self._subdirs(n2)
+                for subdir in sorted(set(subdirs1) | set(subdirs2)):
+                    sn1 = subdirs1.get(subdir, nullid)
+                    sn2 = subdirs2.get(subdir, nullid)
+                    if sn1 == sn2:
+                        continue
+                    subdir = d + subdir
+                    if match is not None and not match.visitdir(subdir[:-1]):
+                        continue
+                    if not narrowmatch.visitdir(subdir[:-1]):
+                        continue
+                    nextlevel.append((subdir, sn1, sn2))
+            level = nextlevel
+
+    def write_caches(self):
+        """persist the caches kept across processes"""
+        if self._subtreecache is not None:
+            self._subtreecache.write()
+        sharedcache = getattr(self._rootstore, '_sharedcache', None)
+        if sharedcache is not None:
+            sharedcache.write()
+
     def clearcaches(self, clear_persisted_data=False):
         self._dirmancache.clear()
+        if self._subtreecache is not None:
+            self._subtreecache.clear(clear_persisted_data=clear_persisted_data)
         self._rootstore.clearcaches(clear_persisted_data=clear_persisted_data)
 
     def rev(self, node):
@@ -2093,7 +2481,7 @@ class manifestctx:
                 if self._node in store.fulltextcache:
                     text = pycompat.bytestr(store.fulltextcache[self._node])
                 else:
-                    text = store.revision(self._node)
+                    text = store._readrevision(self._node)
                     arraytext = bytearray(text)
                     store.fulltextcache[self._node] = arraytext
                 self._data = manifestdict(nc.nodelen, text)
@@ -2199,7 +2587,7 @@ class treemanifestctx:
                 m = treemanifest(self._manifestlog.nodeconstants, dir=self._dir)
 
                 def gettext():
-                    return store.revision(self._node)
+                    return self._manifestlog._readdirtext(store, self._node)
 
                 def readsubtree(dir, subm):
                     # Set verify to False since we need to be able to create
@@ -2213,7 +2601,7 @@ class treemanifestctx:
                 if self._node in store.fulltextcache:
                     text = pycompat.bytestr(store.fulltextcache[self._node])
                 else:
-                    text = store.revision(self._node)
+                    text = store._readrevision(self._node)
                     arraytext = bytearray(text)
                     store.fulltextcache[self._node] = arraytext
                 self._data = treemanifest(
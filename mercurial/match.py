@@ -22,7 +22,10 @@ from . import (
     pycompat,
     util,
 )
-from .utils import stringutil
+from .utils import (
+    hashutil,
+    stringutil,
+)
 
 rustmod = policy.importrust('dirstate')
 
@@ -125,6 +128,7 @@ def _buildkindpatsmatcher(
     ctx=None,
     listsubrepos=False,
     badfn=None,
+    cache=None,
 ):
     matchers = []
     fms, kindpats = _expandsets(
@@ -135,7 +139,7 @@ def _buildkindpatsmatcher(
         badfn=badfn,
     )
     if kindpats:
-        m = matchercls(root, kindpats, badfn=badfn)
+        m = matchercls(root, kindpats, badfn=badfn, cache=cache)
         matchers.append(m)
     if fms:
         matchers.extend(fms)
@@ -159,6 +163,7 @@ def match(
     warn=None,
     badfn=None,
     icasefs=False,
+    cache=None,
 ):
     r"""build an object to match a set of file patterns
 
@@ -176,6 +181,8 @@ def match(
     badfn - optional bad() callback for this matcher instead of the default
     icasefs - make a matcher for wdir on case insensitive filesystems, which
         normalizes the given patterns to the case in the filesystem
+    cache - optional patterncache used to skip parsing pattern files and
+        translating patterns to regular expressions
 
     a pattern is one of:
     'glob:<glob>' - a glob relative to cwd
@@ -251,8 +258,10 @@ def match(
         dirstate = ctx.repo().dirstate
         dsnormalize = dirstate.normalize
 
-        def normalize(patterns, default, root, cwd, auditor, warn):
-            kp = _donormalize(patterns, default, root, cwd, auditor, warn)
+        def normalize(patterns, default, root, cwd, auditor, warn, cache):
+            kp = _donormalize(
+                patterns, default, root, cwd, auditor, warn, cache
+            )
             kindpats = []
             for kind, pats, source in kp:
                 if kind not in (b're', b'relre'):  # regex can't be normalized
@@ -267,7 +276,7 @@ def match(
             return kindpats
 
     if patterns:
-        kindpats = normalize(patterns, default, root, cwd, auditor, warn)
+        kindpats = normalize(patterns, default, root, cwd, auditor, warn, cache)
         if _kindpatsalwaysmatch(kindpats):
             m = alwaysmatcher(badfn)
         else:
@@ -279,6 +288,7 @@ def match(
                 ctx=ctx,
                 listsubrepos=listsubrepos,
                 badfn=badfn,
+                cache=cache,
             )
     else:
         # It's a little strange that no patterns means to match everything.
@@ -286,7 +296,7 @@ def match(
         m = alwaysmatcher(badfn)
 
     if include:
-        kindpats = normalize(include, b'glob', root, cwd, auditor, warn)
+        kindpats = normalize(include, b'glob', root, cwd, auditor, warn, cache)
         im = _buildkindpatsmatcher(
             includematcher,
             root,
@@ -295,10 +305,11 @@ def match(
             ctx=ctx,
             listsubrepos=listsubrepos,
             badfn=None,
+            cache=cache,
         )
         m = intersectmatchers(m, im)
     if exclude:
-        kindpats = normalize(exclude, b'glob', root, cwd, auditor, warn)
+        kindpats = normalize(exclude, b'glob', root, cwd, auditor, warn, cache)
         em = _buildkindpatsmatcher(
             includematcher,
             root,
@@ -307,6 +318,7 @@ def match(
             ctx=ctx,
             listsubrepos=listsubrepos,
             badfn=None,
+            cache=cache,
         )
         m = differencematcher(m, em)
     return m
@@ -333,7 +345,9 @@ def badmatch(match, badfn):
     return m
 
 
-def _donormalize(patterns, default, root, cwd, auditor=None, warn=None):
+def _donormalize(
+    patterns, default, root, cwd, auditor=None, warn=None, cache=None
+):
     """Convert 'kind:pat' from the patterns list to tuples with kind and
     normalized and rooted patterns and with listfiles expanded."""
     kindpats = []
@@ -361,16 +375,19 @@ def _donormalize(patterns, default, root, cwd, auditor=None, warn=None):
             except EnvironmentError:
                 raise error.Abort(_(b"unable to read file list (%s)") % pat)
             for k, p, source in _donormalize(
-                files, default, root, cwd, auditor, warn
+                files, default, root, cwd, auditor, warn, cache
             ):
                 kindpats.append((k, p, pat))
             continue
         elif kind == b'include':
             try:
                 fullpath = os.path.join(root, util.localpath(pat))
-                includepats = readpatternfile(fullpath, warn)
+                if cache is not None:
+                    includepats = cache.readpatternfile(fullpath, warn)
+                else:
+                    includepats = readpatternfile(fullpath, warn)
                 for k, p, source in _donormalize(
-                    includepats, default, root, cwd, auditor, warn
+                    includepats, default, root, cwd, auditor, warn, cache
                 ):
                     kindpats.append((k, p, source or pat))
             except error.Abort as inst:
@@ -634,13 +651,13 @@ class patternmatcher(basematcher):
     False
     """
 
-    def __init__(self, root, kindpats, badfn=None):
+    def __init__(self, root, kindpats, badfn=None, cache=None):
         super(patternmatcher, self).__init__(badfn)
         kindpats.sort()
 
         self._files = _explicitfiles(kindpats)
         self._prefix = _prefix(kindpats)
-        self._pats, self._matchfn = _buildmatch(kindpats, b'$', root)
+        self._pats, self._matchfn = _buildmatch(kindpats, b'$', root, cache)
 
     def matchfn(self, fn):
         if fn in self._fileset:
@@ -714,13 +731,15 @@ class _dirchildren:
 
 
 class includematcher(basematcher):
-    def __init__(self, root, kindpats, badfn=None):
+    def __init__(self, root, kindpats, badfn=None, cache=None):
         super(includematcher, self).__init__(badfn)
         if rustmod is not None:
             # We need to pass the patterns to Rust because they can contain
             # patterns from the user interface
             self._kindpats = kindpats
-        self._pats, self.matchfn = _buildmatch(kindpats, b'(?:/|$)', root)
+        self._pats, self.matchfn = _buildmatch(
+            kindpats, b'(?:/|$)', root, cache
+        )
         self._prefix = _prefix(kindpats)
         roots, dirs, parents = _rootsdirsandparents(kindpats)
         # roots are directories which are recursively included.
@@ -1389,7 +1408,7 @@ def _regex(kind, pat, globsuffix):
     raise error.ProgrammingError(b'not a regex pattern: %s:%s' % (kind, pat))
 
 
-def _buildmatch(kindpats, globsuffix, root):
+def _buildmatch(kindpats, globsuffix, root, cache=None):
     """Return regexp string and a matcher function for kindpats.
     globsuffix is appended to the regexp of globs."""
     matchfuncs = []
@@ -1428,7 +1447,7 @@ def _buildmatch(kindpats, globsuffix, root):
             regex = b'rootfilesin: %s' % stringutil.pprint(list(sorted(dirs)))
             matchfuncs.append(mf)
         else:
-            regex, mf = _buildregexmatch(kindpats, globsuffix)
+            regex, mf = _buildregexmatch(kindpats, globsuffix, cache)
             matchfuncs.append(mf)
 
     if len(matchfuncs) == 1:
@@ -1445,7 +1464,7 @@ def _joinregexes(regexps):
     return b'|'.join(regexps)
 
 
-def _buildregexmatch(kindpats, globsuffix):
+def _buildregexmatch(kindpats, globsuffix, cache=None):
     """Build a match function from a list of kinds and kindpats,
     return regexp string and a matcher function.
 
@@ -1465,7 +1484,10 @@ def _buildregexmatch(kindpats, globsuffix):
             if kind == b'filepath':
                 exact.add(pattern)
                 continue
-            regexps.append(_regex(kind, pattern, globsuffix))
+            if cache is None:
+                regexps.append(_regex(kind, pattern, globsuffix))
+        if cache is not None:
+            regexps = cache.regexes(kindpats, globsuffix)
 
         fullregexp = _joinregexes(regexps)
 
@@ -1623,7 +1645,7 @@ def _prefix(kindpats):
 _commentre = None
 
 
-def readpatternfile(filepath, warn, sourceinfo=False):
+def readpatternfile(filepath, warn, sourceinfo=False, data=None):
     """parse a pattern file, returning a list of
     patterns. These patterns should be given to compile()
     to be validated and converted into a match function.
@@ -1645,6 +1667,9 @@ def readpatternfile(filepath, warn, sourceinfo=False):
     if sourceinfo is set, returns a list of tuples:
     (pattern, lineno, originalline).
     This is useful to debug ignore patterns.
+
+    if data is set, it is used as the content of the file instead of
+    reading it again.
     """
 
     syntaxes = {
@@ -1658,7 +1683,10 @@ def readpatternfile(filepath, warn, sourceinfo=False):
     syntax = b'relre:'
     patterns = []
 
-    fp = open(filepath, b'rb')
+    if data is None:
+        fp = open(filepath, b'rb')
+    else:
+        fp = util.bytesio(data)
     for lineno, line in enumerate(fp, start=1):
         if b"#" in line:
             global _commentre
@@ -1701,3 +1729,116 @@ def readpatternfile(filepath, warn, sourceinfo=False):
             patterns.append(linesyntax + line)
     fp.close()
     return patterns
+
+
+class patterncache:
+    """persistent cache of the work needed to build pattern matchers
+
+    Pattern files are stored parsed, and lists of patterns are stored
+    translated to regular expressions. Both are keyed by a hash of their
+    content, so an edited pattern file simply misses the cache.
+
+    Compiled regular expressions cannot be serialized, so every process
+    still compiles the expressions it gets from here.
+    """
+
+    _header = b'patterncache-v1'
+    # number of most recently used entries kept when writing
+    maxentries = 64
+
+    def __init__(self, vfs, filename):
+        self._vfs = vfs
+        self._filename = filename
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        entries = {}
+        try:
+            data = self._vfs.read(self._filename)
+        except (IOError, OSError):
+            return entries
+        fields = data.split(b'\0')
+        if fields[:2] != [self._header, util.version()]:
+            return entries
+        try:
+            i = 2
+            while i < len(fields):
+                key = fields[i]
+                count = int(fields[i + 1])
+                values = fields[i + 2 : i + 2 + count]
+                if len(values) != count:
+                    return {}
+                entries[key] = values
+                i += 2 + count
+        except (IndexError, ValueError):
+            return {}
+        return entries
+
+    def _get(self, key):
+        if self._entries is None:
+            self._entries = self._load()
+        values = self._entries.pop(key, None)
+        if values is not None:
+            self._entries[key] = values
+        return values
+
+    def _set(self, key, values):
+        # NUL separates the fields of the cache file
+        if any(b'\0' in v for v in values):
+            return
+        self._entries[key] = values
+        self._dirty = True
+
+    def readpatternfile(self, filepath, warn):
+        """cached readpatternfile()"""
+        with open(filepath, b'rb') as fp:
+            data = fp.read()
+        key = pycompat.sysbytes(hashutil.sha1(b'file\0' + data).hexdigest())
+        patterns = self._get(key)
+        if patterns is None:
+            warnings = []
+
+            def cachewarn(msg):
+                warnings.append(msg)
+                if warn:
+                    warn(msg)
+
+            patterns = readpatternfile(filepath, cachewarn, data=data)
+            # warnings must be repeated, so only cache clean files
+            if not warnings:
+                self._set(key, patterns)
+        return patterns
+
+    def regexes(self, kindpats, globsuffix):
+        """return the _regex() of every pattern of kindpats, skipping
+        'filepath' patterns which are not matched by regex"""
+        pats = [(k, p) for k, p, s in kindpats if k != b'filepath']
+        h = hashutil.sha1(b'regex\0%s\0' % globsuffix)
+        for kind, pat in pats:
+            h.update(b'%d:%s%d:%s' % (len(kind), kind, len(pat), pat))
+        key = pycompat.sysbytes(h.hexdigest())
+        regexps = self._get(key)
+        if regexps is None:
+            regexps = [_regex(k, p, globsuffix) for k, p in pats]
+            self._set(key, regexps)
+        return regexps
+
+    def write(self):
+        """write the cache file if anything was added to it
+
+        Failing to write is silently ignored."""
+        if not self._dirty:
+            return
+        fields = [self._header, util.version()]
+        for key, values in list(self._entries.items())[-self.maxentries :]:
+            fields.append(key)
+            fields.append(b'%d' % len(values))
+            fields.extend(values)
+        try:
+            with self._vfs(self._filename, b'wb', atomictemp=True) as fp:
+                fp.write(b'\0'.join(fields))
+        except (IOError, OSError):
+            # this is only a cache, the repository may well be read-only
+            return
+        self._dirty = False
@@ -43,6 +43,9 @@ REVLOGV1_REQUIREMENT = b'revlogv1'
 # allow using ZSTD as compression engine for revlog content
 REVLOG_COMPRESSION_ZSTD = b'revlog-compression-zstd'
 
+# The revlog chunks are compressed with a zstd dictionary shared by the store
+REVLOG_ZSTD_DICTIONARY_REQUIREMENT = b'exp-revlog-zstd-dictionary'
+
 # Increment the sub-version when the revlog v2 format changes to lock out old
 # clients.
 CHANGELOGV2_REQUIREMENT = b'exp-changelog-v2'
@@ -118,6 +121,7 @@ STREAM_FIXED_REQUIREMENTS = {
     GENERALDELTA_REQUIREMENT,
     INTERNAL_PHASE_REQUIREMENT,
     REVLOG_COMPRESSION_ZSTD,
+    REVLOG_ZSTD_DICTIONARY_REQUIREMENT,
     REVLOGV1_REQUIREMENT,
     REVLOGV2_REQUIREMENT,
     SPARSEREVLOG_REQUIREMENT,
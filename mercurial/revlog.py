@@ -16,6 +16,7 @@ and O(changes) merge between branches.
 import binascii
 import collections
 import contextlib
+import functools
 import io
 import os
 import struct
@@ -92,6 +93,8 @@ from .revlogutils import (
     revlogv0,
     rewrite,
     sidedata as sidedatautil,
+    snapshotcache as snapshotcacheutil,
+    zstddict,
 )
 from .utils import (
     storageutil,
@@ -240,6 +243,26 @@ FILE_TOO_SHORT_MSG = _(
 
 hexdigits = b'0123456789abcdefABCDEF'
 
+# maximum number of revisions restored together by `revlog.revisions`
+_REVISIONS_BATCH_SIZE = 1024
+
+# below this number of chunks, threaded decompression is not worth the
+# synchronisation overhead.
+_MIN_THREADED_DECOMPRESSION_BATCH = 8
+
+# thread pools used for chunk decompression, shared by all revlogs
+# {thread-count: executor}
+_decompression_pools = {}
+
+
+def _decompression_pool(threads):
+    """return the shared thread pool decompressing with `threads` workers"""
+    pool = _decompression_pools.get(threads)
+    if pool is None:
+        pool = pycompat.futures.ThreadPoolExecutor(max_workers=threads)
+        _decompression_pools[threads] = pool
+    return pool
+
 
 class _Config:
     def copy(self):
@@ -292,6 +315,8 @@ class DataConfig(_Config):
     mmap_large_index = attr.ib(default=False)
     # how much data is large
     mmap_index_threshold = attr.ib(default=None)
+    # minimal data file size for reading it through mmap (None: never)
+    mmap_data_threshold = attr.ib(default=None)
     # How much data to read and cache into the raw revlog data cache.
     chunk_cache_size = attr.ib(default=65536)
 
@@ -301,6 +326,10 @@ class DataConfig(_Config):
     # The number of chunk cached
     uncompressed_cache_count = attr.ib(default=None)
 
+    # Number of threads used to decompress batches of chunks (None or 1:
+    # decompress on the calling thread)
+    decompression_threads = attr.ib(default=None)
+
     # Allow sparse reading of the revlog data
     with_sparse_read = attr.ib(default=False)
     # minimal density of a sparse read chunk
@@ -343,6 +372,15 @@ class DeltaConfig(_Config):
     lazy_delta_base = attr.ib(default=False)
 
 
+def _is_compressed(compression_mode, data):
+    """True if reading a chunk stored that way involves a decompressor"""
+    if compression_mode == COMP_MODE_DEFAULT:
+        return True
+    if compression_mode == COMP_MODE_INLINE:
+        return data[0:1] not in (b'', b'\0', b'u')
+    return False
+
+
 class _InnerRevlog:
     """An inner layer of the revlog object
 
@@ -363,6 +401,7 @@ class _InnerRevlog:
         feature_config,
         chunk_cache,
         default_compression_header,
+        read_stats=None,
     ):
         self.opener = opener
         self.index = index
@@ -385,11 +424,16 @@ class _InnerRevlog:
         # 3-tuple of file handles being used for active writing.
         self._writinghandles = None
 
+        # inline revlogs interleave index and data, only mmap real data file
+        mmap_threshold = None
+        if not self.inline:
+            mmap_threshold = self.data_config.mmap_data_threshold
         self._segmentfile = randomaccessfile.randomaccessfile(
             self.opener,
             (self.index_file if self.inline else self.data_file),
             self.data_config.chunk_cache_size,
             chunk_cache,
+            mmap_threshold=mmap_threshold,
         )
         self._segmentfile_sidedata = randomaccessfile.randomaccessfile(
             self.opener,
@@ -397,6 +441,10 @@ class _InnerRevlog:
             self.data_config.chunk_cache_size,
         )
 
+        # revlogreadstats to update, None unless the instrumentation is on
+        self.read_stats = None
+        self.set_read_stats(read_stats)
+
         # revlog header -> revlog compressor
         self._decompressors = {}
         # 3-tuple of (node, rev, text) for a raw revision.
@@ -416,6 +464,11 @@ class _InnerRevlog:
 
         self._delay_buffer = None
 
+    def set_read_stats(self, read_stats):
+        """update `read_stats` (a revlogreadstats) on read, None disables it"""
+        self.read_stats = read_stats
+        self._segmentfile.stats = read_stats
+
     @property
     def index_file(self):
         return self.__index_file
@@ -584,10 +637,26 @@ class _InnerRevlog:
 
     def compress(self, data):
         """Generate a possibly-compressed representation of data."""
+        return self._compress_with(self._compressor, data)
+
+    def new_compress_function(self):
+        """return a function behaving like `compress`
+
+        The function uses its own compressor object. Compressor objects are
+        not thread safe, so this is needed to compress data from another
+        thread."""
+        engine = util.compengines[self.feature_config.compression_engine]
+        compressor = engine.revlogcompressor(
+            self.feature_config.compression_engine_options
+        )
+        return functools.partial(self._compress_with, compressor)
+
+    @staticmethod
+    def _compress_with(compressor, data):
         if not data:
             return b'', data
 
-        compressed = self._compressor.compress(data)
+        compressed = compressor.compress(data)
 
         if compressed:
             # The revlog compressor added the header in the returned data.
@@ -823,6 +892,7 @@ class _InnerRevlog:
                 self.opener,
                 self.data_file,
                 self.data_config.chunk_cache_size,
+                mmap_threshold=self.data_config.mmap_data_threshold,
             )
 
             if existing_handles:
@@ -885,13 +955,20 @@ class _InnerRevlog:
 
         Returns a str holding uncompressed data for the requested revision.
         """
+        stats = self.read_stats
         if self._uncompressed_chunk_cache is not None:
             uncomp = self._uncompressed_chunk_cache.get(rev)
             if uncomp is not None:
+                if stats is not None:
+                    stats.uncompressed_cache_hits += 1
                 return uncomp
+            if stats is not None:
+                stats.uncompressed_cache_misses += 1
 
         compression_mode = self.index[rev][10]
         data = self.get_segment_for_revs(rev, rev)[1]
+        if stats is not None and _is_compressed(compression_mode, data):
+            stats.decompressions += 1
         if compression_mode == COMP_MODE_PLAIN:
             uncomp = data
         elif compression_mode == COMP_MODE_DEFAULT:
@@ -933,6 +1010,7 @@ class _InnerRevlog:
         chunks = []
         ladd = chunks.append
 
+        stats = self.read_stats
         if self._uncompressed_chunk_cache is None:
             fetched_revs = revs
         else:
@@ -942,6 +1020,9 @@ class _InnerRevlog:
                     fadd(rev)
                 else:
                     ladd((rev, cached_value))
+            if stats is not None:
+                stats.uncompressed_cache_hits += len(chunks)
+                stats.uncompressed_cache_misses += len(fetched_revs)
 
         if not fetched_revs:
             slicedchunks = ()
@@ -969,9 +1050,7 @@ class _InnerRevlog:
                 for rev in revschunk:
                     ladd((rev, self._chunk(rev)))
 
-            decomp = self.decompress
-            # self._decompressor might be None, but will not be used in that case
-            def_decomp = self._decompressor
+            segments = []
             for rev in revschunk:
                 chunkstart = start(rev)
                 if inline:
@@ -979,16 +1058,11 @@ class _InnerRevlog:
                 chunklength = length(rev)
                 comp_mode = self.index[rev][10]
                 c = buffer(data, chunkstart - offset, chunklength)
-                if comp_mode == COMP_MODE_PLAIN:
-                    c = c
-                elif comp_mode == COMP_MODE_INLINE:
-                    c = decomp(c)
-                elif comp_mode == COMP_MODE_DEFAULT:
-                    c = def_decomp(c)
-                else:
-                    msg = b'unknown compression mode %d'
-                    msg %= comp_mode
-                    raise error.RevlogError(msg)
+                segments.append((rev, comp_mode, c))
+                if stats is not None and _is_compressed(comp_mode, c):
+                    stats.decompressions += 1
+
+            for rev, c in self._decompress_segments(segments):
                 ladd((rev, c))
                 if self._uncompressed_chunk_cache is not None:
                     self._uncompressed_chunk_cache.insert(rev, c, len(c))
@@ -996,6 +1070,99 @@ class _InnerRevlog:
         chunks.sort()
         return [x[1] for x in chunks]
 
+    def _decompress_segments(self, segments):
+        """decompress a list of (rev, compression-mode, raw-chunk) triples
+
+        Returns a list of (rev, uncompressed-chunk) pairs in the same order.
+
+        When `data_config.decompression_threads` is set and the batch is large
+        enough, the work is spread over a shared thread pool. zlib and zstd
+        release the GIL while decompressing so independent chunks can be
+        processed concurrently.
+        """
+        threads = self.data_config.decompression_threads
+        if (
+            threads is None
+            or threads <= 1
+            or len(segments) < _MIN_THREADED_DECOMPRESSION_BATCH
+        ):
+            return self._decompress_segments_serial(segments)
+
+        # hand out contiguous slices rather than single chunks to keep the
+        # per-task overhead small compared to the decompression itself.
+        step = -(-len(segments) // threads)
+        pool = _decompression_pool(threads)
+        jobs = [
+            pool.submit(self._decompress_segments_job, segments[i : i + step])
+            for i in range(0, len(segments), step)
+        ]
+        result = []
+        for job in jobs:
+            result.extend(job.result())
+        return result
+
+    def _decompress_segments_job(self, segments):
+        """decompress segments from a worker thread
+
+        Compressor objects (zstd contexts in particular) are not thread safe,
+        so each job uses its own instead of the ones cached on `self`.
+        """
+        opts = self.feature_config.compression_engine_options
+        compressors = {}
+
+        def get_decompressor(t):
+            compressor = compressors.get(t)
+            if compressor is None:
+                try:
+                    engine = util.compengines.forrevlogheader(t)
+                except KeyError:
+                    raise error.RevlogError(
+                        _(b'unknown compression type %s') % binascii.hexlify(t)
+                    )
+                compressor = engine.revlogcompressor(opts)
+                compressors[t] = compressor
+            return compressor
+
+        def decomp(data):
+            t = bytes(data[0:1])
+            if t in (b'', b'x', b'\0', b'u'):
+                # handled without any compressor object
+                return self.decompress(data)
+            return get_decompressor(t).decompress(data)
+
+        def_decomp = None
+        if self._default_compression_header is not None:
+            header = self._default_compression_header
+            def_decomp = get_decompressor(header).decompress
+        return self._decompress_segments_serial(segments, decomp, def_decomp)
+
+    def _decompress_segments_serial(
+        self,
+        segments,
+        decomp=None,
+        def_decomp=None,
+    ):
+        if decomp is None:
+            decomp = self.decompress
+            # self._decompressor might be None, but will not be used in that
+            # case
+            def_decomp = self._decompressor
+        result = []
+        radd = result.append
+        for rev, comp_mode, c in segments:
+            if comp_mode == COMP_MODE_PLAIN:
+                c = c
+            elif comp_mode == COMP_MODE_INLINE:
+                c = decomp(c)
+            elif comp_mode == COMP_MODE_DEFAULT:
+                c = def_decomp(c)
+            else:
+                msg = b'unknown compression mode %d'
+                msg %= comp_mode
+                raise error.RevlogError(msg)
+            radd((rev, c))
+        return result
+
     def raw_text(self, node, rev):
         """return the possibly unvalidated rawtext for a revision
 
@@ -1012,7 +1179,12 @@ class _InnerRevlog:
         if self._revisioncache:
             cachedrev = self._revisioncache[1]
 
+        stats = self.read_stats
+        if stats is not None:
+            start = util.timer()
         chain, stopped = self._deltachain(rev, stoprev=cachedrev)
+        if stats is not None:
+            deltachain_time = util.timer() - start
         if stopped:
             basetext = self._revisioncache[2]
 
@@ -1038,7 +1210,12 @@ class _InnerRevlog:
             basetext = bytes(bins[0])
             bins = bins[1:]
 
+        if stats is not None:
+            start = util.timer()
         rawtext = mdiff.patches(basetext, bins)
+        if stats is not None:
+            patch_time = util.timer() - start
+            stats.record_chain(len(chain), deltachain_time, patch_time)
         del basetext  # let us have a chance to free memory early
         return (rev, rawtext, False)
 
@@ -1341,6 +1518,9 @@ class revlog:
             self.feature_config = self.opener.options[b'feature-config'].copy()
         else:
             self.feature_config = FeatureConfig()
+        if self.opener.options.get(b'zstd-dictionary'):
+            opts = self.feature_config.compression_engine_options
+            opts[b'zstd.dictionary'] = zstddict.read(self.opener)
         self.feature_config.censorable = censorable
         self.feature_config.canonical_parent_order = canonical_parent_order
         if b'data-config' in self.opener.options:
@@ -1363,6 +1543,18 @@ class revlog:
         self._nodemap_docket = None
         # Mapping of partial identifiers to full nodes.
         self._pcache = {}
+        # persistent cache of fulltext shared between processes (if enabled)
+        self._fulltext_cache = self.opener.options.get(b'fulltext-cache')
+        # node missing from the fulltext cache, to be added once validated
+        self._fulltext_cache_pending = None
+        # persistent storage of the snapshot cache (if enabled)
+        self._persistent_snapshots = self.opener.options.get(
+            b'persistent-snapshot-cache'
+        )
+        # snapshot cache shared by the delta computations (see snapshot_cache)
+        self._snapshot_cache = None
+        # registry of the read statistics (if enabled)
+        self._read_stats = self.opener.options.get(b'revlog-read-stats')
 
         # other optionnals features
 
@@ -1851,6 +2043,7 @@ class revlog:
         devel_nodemap = (
             self._nodemap_file
             and force_nodemap
+            and not self._inline
             and parse_index_v1_nodemap is not None
         )
 
@@ -1907,6 +2100,10 @@ class revlog:
         else:
             default_compression_header = self._docket.default_compression_header
 
+        read_stats = None
+        if self._read_stats is not None:
+            read_stats = self._read_stats.get(self.display_id)
+
         self._inner = _InnerRevlog(
             opener=self.opener,
             index=self.index,
@@ -1919,6 +2116,7 @@ class revlog:
             feature_config=self.feature_config,
             chunk_cache=chunk_cache,
             default_compression_header=default_compression_header,
+            read_stats=read_stats,
         )
 
     def get_revlog(self):
@@ -1993,9 +2191,24 @@ class revlog:
             else:
                 nodemaputil.setup_persistent_nodemap(transaction, self)
 
+    def snapshot_cache(self):
+        """return the SnapshotCache used to search deltas for this revlog
+
+        The same object is shared by all the delta computations, it is warmed
+        from disk when the persistent snapshot cache is enabled."""
+        if self._snapshot_cache is None:
+            cache = None
+            if self._persistent_snapshots is not None:
+                cache = self._persistent_snapshots.load(self)
+            if cache is None:
+                cache = deltautil.SnapshotCache()
+            self._snapshot_cache = cache
+        return self._snapshot_cache
+
     def clearcaches(self):
         """Clear in-memory caches"""
         self._chainbasecache.clear()
+        self._snapshot_cache = None
         self._inner.clear_cache()
         self._pcache = {}
         self._nodemap_docket = None
@@ -2845,6 +3058,105 @@ class revlog:
         """
         return self._revisiondata(nodeorrev)
 
+    def revisions(self, revs, raw=False):
+        """Generate ``(rev, text)`` pairs for many revisions at once
+
+        This is equivalent to calling ``revision()`` (or ``rawdata()`` if
+        ``raw`` is True) for each revision, but the delta chains of all the
+        requested revisions are planned together: the chunks they need are
+        read in disk-offset order, each of them is decompressed only once and
+        intermediate fulltexts shared by several chains are restored only
+        once.
+
+        Revisions are generated in increasing revision order, which is also
+        the order of their data on disk.
+        """
+        revs = sorted(set(revs))
+        if revs and revs[0] == nullrev:
+            yield nullrev, b''
+            revs = revs[1:]
+        # bound the amount of chunks and fulltexts kept in memory at once
+        step = _REVISIONS_BATCH_SIZE
+        for idx in range(0, len(revs), step):
+            batch = revs[idx : idx + step]
+            for rev, rawtext in self._rawtexts(batch):
+                node = self.node(rev)
+                flags = self.flags(rev)
+                if raw:
+                    validatehash = flagutil.processflagsraw(
+                        self, rawtext, flags
+                    )
+                    text = rawtext
+                else:
+                    r = flagutil.processflagsread(self, rawtext, flags)
+                    text, validatehash = r
+                if validatehash:
+                    self.checkhash(text, node, rev=rev)
+                yield rev, text
+
+    def _rawtexts(self, revs):
+        """Generate ``(rev, rawtext)`` for a sorted list of revisions
+
+        The rawtexts are not validated."""
+        stats = self._inner.read_stats
+        if stats is not None:
+            start = util.timer()
+        chains = []
+        # number of (remaining) chains going through each revision
+        refs = collections.Counter()
+        for rev in revs:
+            chain = self._deltachain(rev)[0]
+            chains.append(chain)
+            refs.update(chain)
+        if stats is not None:
+            # split evenly, the chains are computed in one go
+            deltachain_time = (util.timer() - start) / max(len(revs), 1)
+
+        needed = sorted(refs)
+        with self._inner.reading():
+            bins = dict(zip(needed, self._inner._chunks(needed)))
+
+        # fulltexts of revisions used by more than one chain
+        texts = {}
+        for rev, chain in zip(revs, chains):
+            # start from the closest fulltext we already restored
+            for pos in range(len(chain) - 1, -1, -1):
+                base = chain[pos]
+                if base in texts:
+                    text = texts[base]
+                    pos += 1
+                    break
+            else:
+                base = chain[0]
+                text = bytes(bins[base])
+                if refs[base] > 1:
+                    texts[base] = text
+                pos = 1
+
+            if stats is not None:
+                start = util.timer()
+            pending = []
+            for r in chain[pos:]:
+                pending.append(bins[r])
+                if refs[r] > 1:
+                    # materialize the shared intermediate fulltext
+                    text = mdiff.patches(text, pending)
+                    pending = []
+                    texts[r] = text
+            if pending:
+                text = mdiff.patches(text, pending)
+            if stats is not None:
+                walked = len(chain) - pos + 1
+                patch_time = util.timer() - start
+                stats.record_chain(walked, deltachain_time, patch_time)
+            yield rev, text
+
+            for r in chain:
+                refs[r] -= 1
+                if not refs[r]:
+                    texts.pop(r, None)
+                    del bins[r]
+
     def sidedata(self, nodeorrev):
         """a map of extra data related to the changeset but not part of the hash
 
@@ -2873,6 +3185,18 @@ class revlog:
         if rev is None:
             rev = self.rev(node)
 
+        cache = self._fulltext_cache
+        if (
+            cache is not None
+            and self.flags(rev) == REVIDX_DEFAULT_FLAGS
+            and self.chainlen(rev) >= cache.min_chain_length
+        ):
+            rawtext = cache.get(self.radix, node)
+            if rawtext is not None:
+                # the content is checked against the node by our caller
+                return (rev, rawtext, False)
+            self._fulltext_cache_pending = node
+
         return self._inner.raw_text(node, rev)
 
     def _revisiondata(self, nodeorrev, raw=False):
@@ -2916,6 +3240,9 @@ class revlog:
             self.checkhash(text, node, rev=rev)
         if not validated:
             self._inner._revisioncache = (node, rev, rawtext)
+            if self._fulltext_cache_pending == node:
+                self._fulltext_cache_pending = None
+                self._fulltext_cache.set(self.radix, node, rawtext)
 
         return text
 
@@ -3491,6 +3818,7 @@ class revlog:
             self._docket.sidedata_end = files_end[2]
 
         nodemaputil.setup_persistent_nodemap(transaction, self)
+        snapshotcacheutil.setup_persistent_snapshots(transaction, self)
 
     def addgroup(
         self,
@@ -3502,6 +3830,7 @@ class revlog:
         duplicaterevisioncb=None,
         debug_info=None,
         delta_base_reuse_policy=None,
+        compressed_deltas=None,
     ):
         """
         add a delta group
@@ -3512,6 +3841,10 @@ class revlog:
 
         If ``addrevisioncb`` is defined, it will be called with arguments of
         this revlog and the node that was added.
+
+        ``compressed_deltas`` is an optional mapping returned by
+        ``compress_deltas()`` for these deltas. It is used to skip the
+        compression of incoming deltas that are stored as is.
         """
 
         if self._adding_group:
@@ -3539,6 +3872,7 @@ class revlog:
                     self,
                     write_debug=write_debug,
                     debug_info=debug_info,
+                    compressed_deltas=compressed_deltas,
                 )
                 # loop through our set of deltas
                 for data in deltas:
@@ -3621,6 +3955,31 @@ class revlog:
             self._adding_group = False
         return not empty
 
+    def compress_deltas(self, deltas):
+        """compress the deltas of a group before it is added
+
+        ``deltas`` is a list of entries as passed to ``addgroup()``. This
+        returns a mapping suitable for the ``compressed_deltas`` argument of
+        ``addgroup()``.
+
+        This does not access the revlog data and can be called from another
+        thread, for example to compress the next group while this one is
+        written.
+        """
+        compress = self._inner.new_compress_function()
+        hlen = struct.calcsize(b">lll")
+        compressed = {}
+        for data in deltas:
+            node, deltabase, delta = data[0], data[4], data[5]
+            if deltabase == self.nullid and delta[:hlen] == (
+                mdiff.replacediffheader(0, len(delta) - hlen)
+            ):
+                # will be stored as a full snapshot of the new content
+                compressed[node] = (delta, None, compress(delta[hlen:]))
+            else:
+                compressed[node] = (delta, compress(delta), None)
+        return compressed
+
     def iscensored(self, rev):
         """Check if a file revision is censored."""
         if not self.feature_config.censorable:
@@ -3693,6 +4052,7 @@ class revlog:
 
         # then reset internal state in memory to forget those revisions
         self._chaininfocache = util.lrucachedict(500)
+        self._snapshot_cache = None
         self._inner.clear_cache()
 
         del self.index[rev:-1]
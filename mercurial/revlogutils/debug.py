@@ -18,6 +18,7 @@ from .. import (
 from . import (
     constants,
     deltas as deltautil,
+    readstats,
 )
 
 INDEX_ENTRY_DEBUG_COLUMN = []
@@ -712,6 +713,36 @@ def debug_revlog_stats(
         fm.plain(b'\n')
 
 
+def debug_read_stats(revlog, fm, revs):
+    """read revisions of a revlog and display how the reads behaved
+
+    The caches of the revlog are cleared first, so the statistics are the
+    ones of a process reading these revisions for the first time.
+
+    fm: the output formatter.
+    """
+    revlog.clearcaches()
+    stats = readstats.revlogreadstats()
+    revlog._inner.set_read_stats(stats)
+    try:
+        with revlog.reading():
+            for rev in revs:
+                revlog.revision(rev)
+    finally:
+        revlog._inner.set_read_stats(None)
+
+    width = max(len(name) for name, _attr in readstats.FIELDS) + 1
+    fm.startitem()
+    for name, attr in readstats.FIELDS:
+        value = getattr(stats, attr)
+        key = name.replace(b'-', b'_')
+        fm.plain((b'%s:' % name).ljust(width))
+        if isinstance(value, float):
+            fm.write(key, b' %.6f\n', value)
+        else:
+            fm.write(key, b' %d\n', value)
+
+
 class DeltaChainAuditor:
     def __init__(self, revlog):
         self._revlog = revlog
@@ -1063,6 +1063,16 @@ class SnapshotCache:
             self._end_rev,
         )
 
+    def load(self, end_rev, snapshots):
+        """fill an empty cache with the snapshots of revisions [0, end_rev]
+
+        `snapshots` is an iterable of (delta-parent, rev) pairs."""
+        assert self._start_rev is None
+        for base, rev in snapshots:
+            self.snapshots[base].add(rev)
+        self._start_rev = 0
+        self._end_rev = end_rev
+
     def _update(self, revlog, start_rev, end_rev):
         """internal method that actually do update content"""
         assert self._start_rev is None or (
@@ -1089,6 +1099,7 @@ class deltacomputer:
         write_debug=None,
         debug_search=False,
         debug_info=None,
+        compressed_deltas=None,
     ):
         self.revlog = revlog
         self._write_debug = write_debug
@@ -1097,7 +1108,14 @@ class deltacomputer:
         else:
             self._debug_search = debug_search
         self._debug_info = debug_info
-        self._snapshot_cache = SnapshotCache()
+        # {node: (delta, compressed-delta, compressed-fulltext)} for incoming
+        # deltas compressed in advance (see revlog.compress_deltas)
+        self._compressed_deltas = compressed_deltas
+        if revlog.delta_config.sparse_revlog:
+            # shared with the other delta computations on this revlog
+            self._snapshot_cache = revlog.snapshot_cache()
+        else:
+            self._snapshot_cache = SnapshotCache()
 
     @property
     def _gather_debug(self):
@@ -1167,6 +1185,7 @@ class deltacomputer:
             if deltabase not in (p1, p2) and revlog.issnapshot(deltabase):
                 snapshotdepth = len(revlog._deltachain(deltabase)[0])
         delta = None
+        compressed = None
         if revinfo.cachedelta:
             cachebase = revinfo.cachedelta[0]
             # check if the diff still apply
@@ -1179,6 +1198,9 @@ class deltacomputer:
                 currentbase = self.revlog.deltaparent(currentbase)
             if self.revlog.delta_config.lazy_delta and currentbase == base:
                 delta = revinfo.cachedelta[1]
+                pre = self._precompressed(revinfo)
+                if pre is not None:
+                    compressed = pre[1]
         if delta is None:
             delta = self._builddeltadiff(base, revinfo)
         if self._debug_search:
@@ -1205,7 +1227,9 @@ class deltacomputer:
                     msg = b"DBG-DELTAS-SEARCH:     DISCARDED (prev size)\n"
                     self._write_debug(msg)
                 return None
-        header, data = revlog._inner.compress(delta)
+        if compressed is None:
+            compressed = revlog._inner.compress(delta)
+        header, data = compressed
         deltalen = len(header) + len(data)
         offset = revlog.end(len(revlog) - 1)
         dist = deltalen + offset - revlog.start(chainbase)
@@ -1224,9 +1248,24 @@ class deltacomputer:
             snapshotdepth,
         )
 
+    def _precompressed(self, revinfo):
+        """return the entry compressed in advance for this revision if any"""
+        if self._compressed_deltas is None or not revinfo.cachedelta:
+            return None
+        pre = self._compressed_deltas.get(revinfo.node)
+        if pre is None or pre[0] is not revinfo.cachedelta[1]:
+            return None
+        return pre
+
     def _fullsnapshotinfo(self, revinfo, curr):
         rawtext = self.buildtext(revinfo)
-        data = self.revlog._inner.compress(rawtext)
+        data = None
+        if revinfo.cachedelta and revinfo.cachedelta[0] == nullrev:
+            pre = self._precompressed(revinfo)
+            if pre is not None:
+                data = pre[2]
+        if data is None:
+            data = self.revlog._inner.compress(rawtext)
         compresseddeltalen = deltalen = dist = len(data[1]) + len(data[0])
         deltabase = chainbase = curr
         snapshotdepth = 0
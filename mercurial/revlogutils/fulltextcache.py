@@ -0,0 +1,111 @@
+# fulltextcache.py - persistent cache of reconstructed revlog fulltexts
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persistent, cross-process cache of revlog fulltexts
+
+Restoring a revision at the end of a long delta chain is expensive: every
+delta of the chain has to be read, decompressed and applied. This module
+keeps such fulltexts in `.hg/cache/fulltext/` so that they can be reused by
+other processes (hgweb workers, ssh servers, later command invocations...).
+
+Each entry is a file named after a hash of the revlog radix and the node. As
+the node is a hash of the content, an entry never needs to be invalidated,
+the content returned is still validated against the node by the revlog.
+
+The cache is bounded in bytes. Reading an entry updates its mtime and, when
+the cache grows over its limit, the least recently used entries are removed.
+"""
+
+from ..node import hex
+from ..utils import hashutil
+
+# directory used within the cache vfs
+CACHE_DIR = b'fulltext'
+
+
+class fulltextcache:
+    """on-disk LRU cache of revlog fulltexts, shared between processes"""
+
+    def __init__(self, vfs, max_size, min_chain_length=0):
+        self._vfs = vfs
+        self.max_size = max_size
+        # revisions with a shorter delta chain are cheap enough to restore
+        self.min_chain_length = min_chain_length
+        # bytes written by this process since the last size check
+        self._written = 0
+
+    def _path(self, radix, node):
+        key = hex(hashutil.sha1(radix + b'\0' + node).digest())
+        return b'%s/%s/%s' % (CACHE_DIR, key[:2], key[2:])
+
+    def get(self, radix, node):
+        """return the cached fulltext for `node` in revlog `radix` or None"""
+        path = self._path(radix, node)
+        try:
+            with self._vfs(path, b'rb') as fp:
+                data = fp.read()
+        except (IOError, OSError):
+            return None
+        try:
+            # refresh the entry for the LRU eviction
+            self._vfs.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, radix, node, text):
+        """store the fulltext of `node` in revlog `radix`"""
+        if len(text) > self.max_size:
+            return
+        path = self._path(radix, node)
+        try:
+            with self._vfs(path, b'wb', atomictemp=True) as fp:
+                fp.write(text)
+        except (IOError, OSError):
+            # the cache directory might not be writable, this is a cache,
+            # failing to write it is fine.
+            return
+        self._written += len(text)
+        # do not list the whole cache on every write
+        if self._written * 10 >= self.max_size:
+            self._written = 0
+            self.evict()
+
+    def evict(self):
+        """remove the least recently used entries exceeding `max_size`"""
+        entries = []
+        total = 0
+        try:
+            buckets = self._vfs.readdir(CACHE_DIR)
+        except OSError:
+            return
+        for bucket, kind in buckets:
+            bucket = b'%s/%s' % (CACHE_DIR, bucket)
+            try:
+                files = self._vfs.readdir(bucket, stat=True)
+            except OSError:
+                continue
+            for name, kind, st in files:
+                path = b'%s/%s' % (bucket, name)
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for __, size, path in entries:
+            try:
+                self._vfs.unlink(path)
+            except OSError:
+                # probably removed by a concurrent process
+                pass
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def clear(self):
+        """remove all entries"""
+        self._vfs.rmtree(CACHE_DIR, ignore_errors=True)
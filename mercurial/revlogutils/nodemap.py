@@ -18,6 +18,7 @@ from .. import (
     util,
 )
 from . import docket as docket_mod
+from .constants import KIND_FILELOG
 
 
 class NodeMap(dict):
@@ -44,13 +45,12 @@ def post_stream_cleanup(repo):
     unfi = repo.unfiltered()
     delete_nodemap(None, unfi, unfi.changelog)
     delete_nodemap(None, repo, unfi.manifestlog._rootstore._revlog)
+    delete_filelog_nodemaps(repo)
 
 
-def persisted_data(revlog):
-    """read the nodemap for a revlog from disk"""
-    if revlog._nodemap_file is None:
-        return None
-    pdata = revlog.opener.tryread(revlog._nodemap_file)
+def _read_docket(opener, docket_file):
+    """read a nodemap docket from disk, return None if there is none"""
+    pdata = opener.tryread(docket_file)
     if not pdata:
         return None
     offset = 0
@@ -67,6 +67,17 @@ def persisted_data(revlog):
     docket.tip_node = pdata[offset : offset + tip_node_size]
     docket.data_length = data_length
     docket.data_unused = data_unused
+    return docket
+
+
+def persisted_data(revlog):
+    """read the nodemap for a revlog from disk"""
+    if revlog._nodemap_file is None:
+        return None
+    docket = _read_docket(revlog.opener, revlog._nodemap_file)
+    if docket is None:
+        return None
+    data_length = docket.data_length
 
     filename = _rawdata_filepath(revlog, docket)
     use_mmap = revlog.opener.options.get(b"persistent-nodemap.mmap")
@@ -89,6 +100,16 @@ def persisted_data(revlog):
     return docket, data
 
 
+def _below_threshold(revlog):
+    """True for filelogs too small to get a persistent nodemap
+
+    Building the nodemap of a small filelog from its index is cheap enough."""
+    if revlog.target[0] != KIND_FILELOG:
+        return False
+    threshold = revlog.opener.options.get(b'persistent-nodemap.filelogs', 0)
+    return len(revlog) < threshold
+
+
 def setup_persistent_nodemap(tr, revlog):
     """Install whatever is needed transaction side to persist a nodemap on disk
 
@@ -98,11 +119,16 @@ def setup_persistent_nodemap(tr, revlog):
         return  # inlined revlog are too small for this to be relevant
     if revlog._nodemap_file is None:
         return  # we do not use persistent_nodemap on this revlog
+    if _below_threshold(revlog):
+        return
 
     # we need to happen after the changelog finalization, in that use "cl-"
     callback_id = b"nm-revlog-persistent-nodemap-%s" % revlog._nodemap_file
     if tr.hasfinalize(callback_id):
-        return  # no need to register again
+        if revlog.target[0] != KIND_FILELOG:
+            return  # no need to register again
+        # A new filelog object is created for each access, the last one
+        # used to write knows about the revisions added by the previous ones.
     tr.addpending(
         callback_id, lambda tr: persist_nodemap(tr, revlog, pending=True)
     )
@@ -144,6 +170,8 @@ def update_persistent_nodemap(revlog):
         return  # inlined revlog are too small for this to be relevant
     if revlog._nodemap_file is None:
         return  # we do not use persistent_nodemap on this revlog
+    if _below_threshold(revlog):
+        return
 
     notr = _NoTransaction()
     persist_nodemap(notr, revlog)
@@ -161,6 +189,24 @@ def delete_nodemap(tr, repo, revlog):
             repo.svfs.tryunlink(f)
 
 
+def delete_filelog_nodemaps(repo):
+    """Delete nodemap data on disk for all the filelogs
+
+    Listing the directory of each filelog would be too expensive, so only
+    the data file referenced by the docket is deleted with it."""
+    svfs = repo.svfs
+    for entry in repo.store.data_entries():
+        if not (entry.is_revlog and entry.is_filelog):
+            continue
+        radix = entry.main_file_path()[: -len(b'.i')]
+        docket_file = radix + b'.n'
+        docket = _read_docket(svfs, docket_file)
+        if docket is None:
+            continue
+        svfs.tryunlink(b"%s-%s.nd" % (radix, docket.uid))
+        svfs.tryunlink(docket_file)
+
+
 def persist_nodemap(tr, revlog, pending=False, force=False):
     """Write nodemap data on disk for a given revlog"""
     if getattr(revlog, 'filteredrevs', ()):
@@ -174,6 +220,11 @@ def persist_nodemap(tr, revlog, pending=False, force=False):
             msg = "calling persist nodemap on a revlog without the feature enabled"
             raise error.ProgrammingError(msg)
 
+    is_filelog = revlog.target[0] == KIND_FILELOG
+    previous_docket = None
+    if is_filelog:
+        previous_docket = _read_docket(revlog.opener, revlog._nodemap_file)
+
     can_incremental = hasattr(revlog.index, "nodemap_data_incremental")
     ondisk_docket = revlog._nodemap_docket
     feed_data = hasattr(revlog.index, "update_nodemap_data")
@@ -259,9 +310,17 @@ def persist_nodemap(tr, revlog, pending=False, force=False):
     if feed_data:
         revlog.index.update_nodemap_data(target_docket, new_data)
 
-    # search for old index file in all cases, some older process might have
-    # left one behind.
-    olds = _other_rawdata_filepath(revlog, target_docket)
+    if is_filelog:
+        # listing the directory of each filelog is too expensive, only the
+        # data file of the previous docket is removed.
+        olds = []
+        if previous_docket is not None:
+            if previous_docket.uid != target_docket.uid:
+                olds.append(_rawdata_filepath(revlog, previous_docket))
+    else:
+        # search for old index file in all cases, some older process might
+        # have left one behind.
+        olds = _other_rawdata_filepath(revlog, target_docket)
     if olds:
         realvfs = getattr(revlog, '_realopener', revlog.opener)
 
@@ -102,6 +102,7 @@ class randomaccessfile:
         filename,
         default_cached_chunk_size,
         initial_cache=None,
+        mmap_threshold=None,
     ):
         # Required by bitwise manipulation below
         assert _is_power_of_two(default_cached_chunk_size)
@@ -116,11 +117,23 @@ class randomaccessfile:
         if initial_cache:
             self._cached_chunk_position, self._cached_chunk = initial_cache
 
+        # files at least this large are memory-mapped for reading (None
+        # disables mmap entirely)
+        self.mmap_threshold = mmap_threshold
+        # None: not tried yet, b'': not mmapped, otherwise the mapped data
+        self._mmap = None
+
+        # revlogreadstats updated by the reads, if enabled (set from revlog.py)
+        self.stats = None
+
         self._delay_buffer = None
 
     def clear_cache(self):
         self._cached_chunk = b''
         self._cached_chunk_position = 0
+        # The mapping is not explicitly closed as memoryview slices of it
+        # might still be alive. Dropping the reference is enough.
+        self._mmap = None
 
     @property
     def is_open(self):
@@ -189,17 +202,54 @@ class randomaccessfile:
         Raises if the requested number of bytes could not be read.
         """
         end = offset + length
+        if self.mmap_threshold is not None and self.writing_handle is None:
+            mapped = self._get_mmap(end)
+            if mapped:
+                if self.stats is not None:
+                    self.stats.mmap_reads += 1
+                # zero-copy slice of the mapped file
+                return util.buffer(mapped, offset, length)
         cache_start = self._cached_chunk_position
         cache_end = cache_start + len(self._cached_chunk)
         # Is the requested chunk within the cache?
         if cache_start <= offset and end <= cache_end:
+            if self.stats is not None:
+                self.stats.chunk_cache_hits += 1
             if cache_start == offset and end == cache_end:
                 return self._cached_chunk  # avoid a copy
             relative_start = offset - cache_start
             return util.buffer(self._cached_chunk, relative_start, length)
 
+        if self.stats is not None:
+            self.stats.chunk_cache_misses += 1
         return self._read_and_update_cache(offset, length)
 
+    def _get_mmap(self, end):
+        """return a read-only mapping of the file covering offset `end`
+
+        Return None (or an empty value) if the file should not or cannot be
+        mapped, in which case the caller must fall back to regular reads.
+        """
+        if self._delay_buffer is not None:
+            return None
+        mapped = self._mmap
+        if mapped is not None and (not mapped or end <= len(mapped)):
+            return mapped
+        # either never mapped, or the file grew since we mapped it.
+        try:
+            with self.opener(self.filename) as fp:
+                if self.opener.fstat(fp).st_size < self.mmap_threshold:
+                    mapped = b''
+                else:
+                    mapped = util.mmapread(fp)
+        except FileNotFoundError:
+            mapped = b''
+        self._mmap = mapped
+        if end > len(mapped):
+            # let the regular read path deal with (and report) short reads
+            return None
+        return mapped
+
     def _read_and_update_cache(self, offset, length):
         # Cache data both forward and backward around the requested
         # data, in a fixed size window. This helps speed up operations
@@ -212,6 +262,8 @@ class randomaccessfile:
         with self._read_handle() as file_obj:
             file_obj.seek(real_offset)
             data = file_obj.read(real_length)
+        if self.stats is not None:
+            self.stats.bytes_read += len(data)
 
         self._add_cached_chunk(real_offset, data)
 
@@ -0,0 +1,103 @@
+# readstats.py - statistics about the way revlogs are read
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""opt-in counters describing how revlog revisions are read
+
+When `experimental.revlog.read-stats` is set, every revlog read by a command
+records the behavior of its caches, the amount of data read and decompressed,
+and the delta chains it had to restore. The counters of all the revlogs are
+written through `ui.log` when the command finishes, and `hg
+debug-revlog-read-stats` displays them for a given revlog.
+
+The counters are shared by all the instances of a given revlog in a process.
+"""
+
+# (displayed name, attribute) of the counters, in display order
+FIELDS = (
+    (b'chunk-cache-hits', 'chunk_cache_hits'),
+    (b'chunk-cache-misses', 'chunk_cache_misses'),
+    (b'mmap-reads', 'mmap_reads'),
+    (b'bytes-read', 'bytes_read'),
+    (b'uncompressed-cache-hits', 'uncompressed_cache_hits'),
+    (b'uncompressed-cache-misses', 'uncompressed_cache_misses'),
+    (b'decompressions', 'decompressions'),
+    (b'chains', 'chains'),
+    (b'chain-revs', 'chain_revs'),
+    (b'max-chain-length', 'max_chain_length'),
+    (b'deltachain-time', 'deltachain_time'),
+    (b'patch-time', 'patch_time'),
+)
+
+
+class revlogreadstats:
+    """counters of a single revlog"""
+
+    __slots__ = tuple(attr for _name, attr in FIELDS)
+
+    def __init__(self):
+        self.chunk_cache_hits = 0
+        self.chunk_cache_misses = 0
+        self.mmap_reads = 0
+        self.bytes_read = 0
+        self.uncompressed_cache_hits = 0
+        self.uncompressed_cache_misses = 0
+        self.decompressions = 0
+        self.chains = 0
+        self.chain_revs = 0
+        self.max_chain_length = 0
+        self.deltachain_time = 0.0
+        self.patch_time = 0.0
+
+    def record_chain(self, length, deltachain_time, patch_time):
+        """record the restoration of a revision from a delta chain"""
+        self.chains += 1
+        self.chain_revs += length
+        if length > self.max_chain_length:
+            self.max_chain_length = length
+        self.deltachain_time += deltachain_time
+        self.patch_time += patch_time
+
+    def items(self):
+        """(name, value) pairs of the counters, in display order"""
+        return [(name, getattr(self, attr)) for name, attr in FIELDS]
+
+    def __bool__(self):
+        return any(v for _n, v in self.items())
+
+
+class readstatsregistry:
+    """the counters of all the revlogs read by a process"""
+
+    def __init__(self):
+        self._stats = {}
+
+    def get(self, display_id):
+        """return the counters of the revlog identified by `display_id`"""
+        stats = self._stats.get(display_id)
+        if stats is None:
+            stats = self._stats[display_id] = revlogreadstats()
+        return stats
+
+    def items(self):
+        """(display_id, counters) pairs of the revlogs actually read"""
+        return [(k, v) for k, v in sorted(self._stats.items()) if v]
+
+    def log(self, ui):
+        """write the counters of each revlog read through `ui.log`"""
+        for display_id, stats in self.items():
+            values = []
+            for name, value in stats.items():
+                if isinstance(value, float):
+                    values.append(b'%s=%.6f' % (name, value))
+                else:
+                    values.append(b'%s=%d' % (name, value))
+            ui.log(
+                b'revlog-read-stats',
+                b'%s: %s\n',
+                display_id,
+                b' '.join(values),
+            )
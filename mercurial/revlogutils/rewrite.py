@@ -40,6 +40,7 @@ from .. import (
     mdiff,
     pycompat,
     revlogutils,
+    state as statemod,
     util,
 )
 from ..utils import (
@@ -130,6 +131,133 @@ def v1_censor(rl, tr, censornode, tombstone=b''):
     rl._load_inner(chunk_cache)
 
 
+def redelta_revlog(rl, tr, compression_level=None):
+    """recompute every delta of a "version 1" revlog
+
+    All revisions are added again to a new revlog, letting the delta
+    computer pick new bases and optionally compressing the chunks at another
+    level. The new revlog then replaces the old one."""
+    assert rl._format_version == constants.REVLOGV1, rl._format_version
+
+    # avoid cycle
+    from .. import revlog
+
+    newrl = revlog.revlog(
+        rl.opener,
+        target=rl.target,
+        radix=rl.radix,
+        postfix=b'tmpredelta',
+        censorable=rl.feature_config.censorable,
+    )
+    newrl._format_version = rl._format_version
+    newrl._format_flags = rl._format_flags
+    newrl.delta_config.general_delta = rl.delta_config.general_delta
+    newrl._parse_index = rl._parse_index
+    if compression_level is not None:
+        engine = newrl.feature_config.compression_engine
+        options = newrl.feature_config.compression_engine_options
+        options[b'%s.level' % engine] = compression_level
+
+    rl.clone(tr, newrl, deltareuse=rl.DELTAREUSENEVER)
+
+    tr.addbackup(rl._indexfile, location=b'store')
+    if not rl._inline:
+        tr.addbackup(rl._datafile, location=b'store')
+
+    # If the new revlog outgrew the inline format, its index is only moved
+    # back in place when the transaction is finalized. So the files are
+    # swapped after that.
+    def swap_files(tr):
+        rl.opener.rename(newrl._indexfile, rl._indexfile)
+        if not newrl._inline:
+            rl.opener.rename(newrl._datafile, rl._datafile)
+            rl.opener.register_file(rl._datafile)
+        elif not rl._inline:
+            # the new revlog fits in its index, the old data file is only
+            # needed by the backup
+            rl.opener.unlink(rl._datafile)
+
+        rl.clearcaches()
+        chunk_cache = rl._loadindex()
+        rl._load_inner(chunk_cache)
+
+    tr.addfinalize(b'999-redelta-%s' % rl.radix, swap_files)
+
+
+# name of the file recording the progress of `incremental_redelta`
+REDELTA_STATE_FILE = b'redelta-state'
+REDELTA_STATE_VERSION = 1
+
+
+def incremental_redelta(
+    ui,
+    repo,
+    max_revisions=0,
+    cold_after=0,
+    compression_level=None,
+    restart=False,
+):
+    """recompute the deltas of the filelogs and manifests of a repository
+
+    Each revlog is rewritten in its own locks and transaction, so other
+    writers are only blocked for the time needed to rewrite one revlog. The
+    revlogs are processed in a stable order and the last one processed is
+    recorded, so an interrupted run is resumed by the next one.
+
+    `max_revisions` bounds the number of revisions rewritten by one run,
+    0 means no limit. Revlogs modified in the last `cold_after` changesets
+    are skipped.
+    """
+    repo = repo.unfiltered()
+    state = statemod.cmdstate(repo, REDELTA_STATE_FILE)
+    last = None
+    if restart:
+        state.delete()
+    elif state.exists():
+        last = state.read()[b'last']
+
+    entries = [
+        e for e in repo.store.walk() if e.is_revlog and not e.is_changelog
+    ]
+    entries.sort(key=lambda e: e.main_file_path())
+
+    progress = ui.makeprogress(
+        _(b'rewriting revlogs'), unit=_(b'revlogs'), total=len(entries)
+    )
+    rewritten_revlogs = 0
+    rewritten_revisions = 0
+    complete = True
+    for entry in entries:
+        progress.increment()
+        path = entry.main_file_path()
+        if last is not None and path <= last:
+            continue
+        if max_revisions and rewritten_revisions >= max_revisions:
+            complete = False
+            break
+        with repo.wlock(), repo.lock():
+            with repo.transaction(b'redelta') as tr:
+                rl = entry.get_revlog_instance(repo)
+                rl = getattr(rl, '_revlog', rl)
+                tiprev = len(rl) - 1
+                if tiprev >= 0:
+                    age = len(repo.changelog) - 1 - rl.linkrev(tiprev)
+                    if age >= cold_after:
+                        ui.note(_(b'rewriting %s\n') % path)
+                        redelta_revlog(rl, tr, compression_level)
+                        rewritten_revlogs += 1
+                        rewritten_revisions += len(rl)
+            state.save(REDELTA_STATE_VERSION, {b'last': path})
+    progress.complete()
+
+    msg = _(b'%d revisions rewritten in %d revlogs\n')
+    ui.status(msg % (rewritten_revisions, rewritten_revlogs))
+    if complete:
+        state.delete()
+    else:
+        ui.status(_(b'stopped early, run the command again to resume\n'))
+
+
 def v2_censor(revlog, tr, censornode, tombstone=b''):
     """censors a revision in a "version 2" revlog"""
     assert revlog._format_version != REVLOGV0, revlog._format_version
@@ -0,0 +1,115 @@
+# snapshotcache.py - persistent cache of the snapshots of revlogs
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""persist the snapshots of sparse revlogs between processes
+
+The delta search of sparse revlogs needs to know the snapshots of the revlog
+and their bases (see `deltas.SnapshotCache`). Finding them means scanning the
+index, which is expensive on large revlogs and has to be done again by every
+process adding revisions.
+
+This module keeps that information in `.hg/cache/snapshots/`, one file per
+revlog. Files are updated when a transaction adding revisions to the revlog
+closes and are validated against the revlog content when loaded:
+
+- the version of the format (1 byte),
+- the tip revision covered by the cache (signed 4 bytes),
+- the number of snapshots (4 bytes),
+- the node of the tip revision,
+- one entry per snapshot: its delta parent and its revision (2 x 4 bytes).
+"""
+
+import struct
+
+from ..node import hex
+from ..utils import hashutil
+from . import deltas
+
+# directory used within the cache vfs
+CACHE_DIR = b'snapshots'
+
+ONDISK_VERSION = 1
+S_HEADER = struct.Struct(">Bil")
+S_ENTRY = struct.Struct(">ii")
+
+
+class persistentsnapshotcache:
+    """read and write the snapshot cache of revlogs"""
+
+    def __init__(self, vfs):
+        self._vfs = vfs
+
+    def _path(self, revlog):
+        key = hex(hashutil.sha1(revlog.radix).digest())
+        return b'%s/%s' % (CACHE_DIR, key)
+
+    def load(self, revlog):
+        """return a SnapshotCache warmed from disk, or None"""
+        try:
+            data = self._vfs.read(self._path(revlog))
+        except (IOError, OSError):
+            return None
+        offset = S_HEADER.size
+        if len(data) < offset:
+            return None
+        version, tip_rev, count = S_HEADER.unpack_from(data)
+        if version != ONDISK_VERSION:
+            return None
+        node_size = revlog.nodeconstants.nodelen
+        tip_node = data[offset : offset + node_size]
+        offset += node_size
+        if len(data) != offset + count * S_ENTRY.size:
+            return None
+        # make sure the revlog has not been stripped or rewritten since
+        if tip_rev >= len(revlog) or revlog.node(tip_rev) != tip_node:
+            return None
+        deltaparent = revlog.deltaparent
+        snapshots = []
+        for base, rev in S_ENTRY.iter_unpack(data[offset:]):
+            if rev > tip_rev or deltaparent(rev) != base:
+                return None
+            snapshots.append((base, rev))
+        cache = deltas.SnapshotCache()
+        cache.load(tip_rev, snapshots)
+        return cache
+
+    def write(self, revlog, cache):
+        """write the content of `cache` (a SnapshotCache) for `revlog`"""
+        tip_rev = len(revlog) - 1
+        if tip_rev < 0:
+            return
+        # the cache must cover all revisions to be reusable
+        cache.update(revlog, 0)
+        snapshots = [
+            (base, rev)
+            for base, revs in sorted(cache.snapshots.items())
+            for rev in sorted(revs)
+        ]
+        data = [
+            S_HEADER.pack(ONDISK_VERSION, tip_rev, len(snapshots)),
+            revlog.node(tip_rev),
+        ]
+        data.extend(S_ENTRY.pack(*s) for s in snapshots)
+        try:
+            with self._vfs(self._path(revlog), b'wb', atomictemp=True) as fp:
+                fp.write(b''.join(data))
+        except (IOError, OSError):
+            # this is a cache, failing to write it is fine.
+            pass
+
+
+def setup_persistent_snapshots(tr, revlog):
+    """write the snapshot cache of `revlog` once `tr` is closed
+
+    (only actually persist the cache if it is relevant for this revlog)
+    """
+    store = revlog._persistent_snapshots
+    cache = revlog._snapshot_cache
+    if store is None or cache is None:
+        return  # no snapshot search happened or no persistence
+    callback_id = b"snapshot-cache-%s" % revlog.radix
+    tr.addpostclose(callback_id, lambda tr: store.write(revlog, cache))
@@ -0,0 +1,92 @@
+# zstddict.py - zstd dictionary shared by the revlogs of a store
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""zstd compression dictionary shared by the revlogs of a store
+
+Each revlog chunk is compressed on its own. Most filelog and manifest chunks
+are small deltas that zstd cannot compress well without context. A trained
+dictionary provides that context: it is built from samples of the existing
+chunks and used by every compressor and decompressor of the store.
+
+The dictionary lives in the `revlog-zstd-dict` file of the store. It is
+(re)trained when `hg debugupgraderepo` recompresses all the revlogs, the
+chunks compressed with a given dictionary can only be read with it, so it
+must never change while some chunks still depend on it.
+"""
+
+from .. import util
+
+# name of the dictionary file within the store
+DICT_FILE = b'revlog-zstd-dict'
+
+# the default size of dictionaries trained by the zstd command line
+DEFAULT_SIZE = 112640
+
+# zstd advises training on about a hundred times the dictionary size
+SAMPLES_FACTOR = 100
+
+# process level cache: path -> ((size, mtime), data)
+_cache = {}
+
+
+def read(vfs):
+    """return the dictionary stored in the store behind `vfs`, or None"""
+    try:
+        st = vfs.stat(DICT_FILE)
+    except FileNotFoundError:
+        return None
+    path = vfs.join(DICT_FILE)
+    key = (st.st_size, st.st_mtime)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    data = vfs.read(DICT_FILE)
+    _cache[path] = (key, data)
+    return data
+
+
+def write(vfs, data):
+    """store `data` as the dictionary of the store behind `vfs`"""
+    with vfs(DICT_FILE, b'wb', atomictemp=True) as fp:
+        fp.write(data)
+
+
+def _samples(repo, budget):
+    """gather uncompressed chunks from all the revlogs of `repo`
+
+    The most recent revisions of each revlog are used, `budget` bytes of
+    samples are gathered in total."""
+    entries = [e for e in repo.store.walk() if e.is_revlog]
+    if not entries:
+        return []
+    per_revlog = max(budget // len(entries), 1024)
+    samples = []
+    for entry in entries:
+        rl = entry.get_revlog_instance(repo)
+        rl = getattr(rl, '_revlog', rl)
+        gathered = 0
+        with rl.reading():
+            for rev in reversed(rl):
+                chunk = bytes(rl._inner._chunk(rev))
+                if not chunk:
+                    continue
+                samples.append(chunk)
+                gathered += len(chunk)
+                if gathered >= per_revlog:
+                    break
+    return samples
+
+
+def train(repo, size=DEFAULT_SIZE):
+    """train a dictionary from the content of `repo`
+
+    Return None if there is not enough content to train a dictionary."""
+    engine = util.compengines[b'zstd']
+    samples = _samples(repo, size * SAMPLES_FACTOR)
+    if not samples:
+        return None
+    return engine.traindictionary(samples, size)
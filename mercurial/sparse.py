@@ -341,6 +341,7 @@ def matcher(repo, revs=None, includetemp=True):
     if result:
         return result
 
+    cache = repo._patterncache
     matchers = []
     for rev in revs:
         try:
@@ -354,10 +355,13 @@ def matcher(repo, revs=None, includetemp=True):
                     include=includes,
                     exclude=excludes,
                     default=b'relpath',
+                    cache=cache,
                 )
                 matchers.append(matcher)
         except IOError:
             pass
+    if cache is not None:
+        cache.write()
 
     if not matchers:
         result = matchmod.always()
@@ -21,6 +21,7 @@ from .revlogutils.constants import (
     KIND_FILELOG,
     KIND_MANIFESTLOG,
 )
+from .revlogutils import zstddict
 from . import (
     changelog,
     error,
@@ -388,6 +389,7 @@ _data = [
     b'00changelog.i',
     b'phaseroots',
     b'obsstore',
+    b'revlog-zstd-dict',
     b'requires',
 ]
 
@@ -834,6 +836,13 @@ class basicstore:
                 is_volatile=True,
             )
 
+        # the revlogs cannot be read without the dictionary they use
+        if self.vfs.exists(zstddict.DICT_FILE):
+            yield SimpleStoreEntry(
+                entry_path=zstddict.DICT_FILE,
+                is_volatile=False,
+            )
+
         files = reversed(self._walk(b'', False))
 
         changelogs = collections.defaultdict(dict)
@@ -1178,6 +1187,7 @@ class fncachestore(basicstore):
             b'fncache',
             b'phaseroots',
             b'obsstore',
+            b'revlog-zstd-dict',
             b'00manifest.d',
             b'00manifest.i',
             b'00changelog.d',
@@ -31,6 +31,7 @@ RECLONES_REQUIREMENTS = {
     requirements.SPARSEREVLOG_REQUIREMENT,
     requirements.REVLOGV2_REQUIREMENT,
     requirements.CHANGELOGV2_REQUIREMENT,
+    requirements.REVLOG_ZSTD_DICTIONARY_REQUIREMENT,
 }
 
 
@@ -504,6 +505,25 @@ class compressionlevel(formatvariant):
         return bytes(level)
 
 
+@registerformatvariant
+class zstddictionary(requirementformatvariant):
+    name = b'zstd-dictionary'
+
+    _requirement = requirements.REVLOG_ZSTD_DICTIONARY_REQUIREMENT
+
+    default = False
+
+    description = _(
+        b'revlog chunks are compressed independently from each other, '
+        b'small deltas compress poorly'
+    )
+
+    upgrademessage = _(
+        b'revlog content will be recompressed with a zstd dictionary '
+        b'trained on the repository content'
+    )
+
+
 def find_format_upgrades(repo):
     """returns a list of format upgrades which can be perform on the repo"""
     upgrades = []
@@ -1022,6 +1042,7 @@ def supportremovedrequirements(repo):
             supported.add(b'exp-compression-%s' % name)
             if engine.name() == b'zstd':
                 supported.add(b'revlog-compression-zstd')
+                supported.add(requirements.REVLOG_ZSTD_DICTIONARY_REQUIREMENT)
     return supported
 
 
@@ -1057,6 +1078,7 @@ def supporteddestrequirements(repo):
             supported.add(b'exp-compression-%s' % name)
             if engine.name() == b'zstd':
                 supported.add(b'revlog-compression-zstd')
+                supported.add(requirements.REVLOG_ZSTD_DICTIONARY_REQUIREMENT)
     return supported
 
 
@@ -1090,6 +1112,7 @@ def allowednewrequirements(repo):
             supported.add(b'exp-compression-%s' % name)
             if engine.name() == b'zstd':
                 supported.add(b'revlog-compression-zstd')
+                supported.add(requirements.REVLOG_ZSTD_DICTIONARY_REQUIREMENT)
     return supported
 
 
@@ -24,6 +24,7 @@ from ..revlogutils import (
     flagutil,
     nodemap,
     sidedata as sidedatamod,
+    zstddict,
 )
 from . import actions as upgrade_actions
 
@@ -380,11 +381,32 @@ def _files_to_copy_post_revlog_clone(srcrepo):
         # Skip other skipped files.
         if path in (b'lock', b'fncache'):
             continue
+        # the dictionary is handled before the revlogs are cloned
+        if path == zstddict.DICT_FILE:
+            continue
         # TODO: should we skip cache too?
 
         yield path
 
 
+def _prepare_zstd_dictionary(ui, srcrepo, dstrepo, upgrade_op):
+    """write the zstd dictionary the destination revlogs will use
+
+    A new dictionary is trained when all the revlogs are recompressed. The
+    revlogs copied as is still need the dictionary of the source."""
+    if upgrade_op.revlogs_to_process == UPGRADE_ALL_REVLOGS:
+        ui.status(_(b'training zstd compression dictionary\n'))
+        data = zstddict.train(srcrepo)
+        if data is None:
+            ui.status(_(b'not enough data to train a dictionary\n'))
+            return
+    else:
+        data = zstddict.read(srcrepo.svfs)
+        if data is None:
+            return
+    zstddict.write(dstrepo.svfs, data)
+
+
 def _replacestores(currentrepo, upgradedrepo, backupvfs, upgrade_op):
     """Replace the stores after current repository is upgraded
 
@@ -505,8 +527,13 @@ def upgrade(ui, srcrepo, dstrepo, upgrade_op):
             nodemap.delete_nodemap(
                 tr, srcrepo, unfi.manifestlog._rootstore._revlog
             )
+            nodemap.delete_filelog_nodemaps(srcrepo)
         scmutil.writereporequirements(srcrepo, upgrade_op.new_requirements)
     else:
+        dict_req = requirements.REVLOG_ZSTD_DICTIONARY_REQUIREMENT
+        if dict_req in upgrade_op.new_requirements:
+            _prepare_zstd_dictionary(ui, srcrepo, dstrepo, upgrade_op)
+
         with dstrepo.transaction(b'upgrade') as tr:
             _clonerevlogs(
                 ui,
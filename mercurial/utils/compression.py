@@ -696,13 +696,20 @@ class _zstdengine(compressionengine):
         return _ZstdCompressedStreamReader(fh, self._module)
 
     class zstdrevlogcompressor:
-        def __init__(self, zstd, level=3):
+        def __init__(self, zstd, level=3, dictionary=None):
             # TODO consider omitting frame magic to save 4 bytes.
             # This writes content sizes into the frame header. That is
             # extra storage. But it allows a correct size memory allocation
             # to hold the result.
-            self._cctx = zstd.ZstdCompressor(level=level)
-            self._dctx = zstd.ZstdDecompressor()
+            if dictionary is None:
+                self._cctx = zstd.ZstdCompressor(level=level)
+                self._dctx = zstd.ZstdDecompressor()
+            else:
+                # small chunks share a lot of content with each other, a
+                # trained dictionary lets zstd take advantage of it.
+                d = zstd.ZstdCompressionDict(dictionary)
+                self._cctx = zstd.ZstdCompressor(level=level, dict_data=d)
+                self._dctx = zstd.ZstdDecompressor(dict_data=d)
             self._compinsize = zstd.COMPRESSION_RECOMMENDED_INPUT_SIZE
             self._decompinsize = zstd.DECOMPRESSION_RECOMMENDED_INPUT_SIZE
 
@@ -766,7 +773,23 @@ class _zstdengine(compressionengine):
             level = opts.get(b'level')
         if level is None:
             level = 3
-        return self.zstdrevlogcompressor(self._module, level=level)
+        dictionary = opts.get(b'zstd.dictionary')
+        return self.zstdrevlogcompressor(
+            self._module, level=level, dictionary=dictionary
+        )
+
+    def traindictionary(self, samples, size):
+        """train a compression dictionary of `size` bytes from `samples`
+
+        The returned data can be passed as the ``zstd.dictionary`` option of
+        ``revlogcompressor()``. None is returned if the samples are not
+        sufficient to train a dictionary.
+        """
+        zstd = self._module
+        try:
+            return zstd.train_dictionary(size, samples).as_bytes()
+        except zstd.ZstdError:
+            return None
 
 
 compengines.register(_zstdengine())
@@ -812,6 +812,11 @@ def has_linuxormacos():
     return sys.platform.startswith(('linux', 'darwin'))
 
 
+@check("inotify", "Linux inotify file watching")
+def has_inotify():
+    return sys.platform.startswith('linux')
+
+
 @check("docker", "docker support")
 def has_docker():
     pat = br'A self-sufficient runtime for'
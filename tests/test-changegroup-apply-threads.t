@@ -0,0 +1,39 @@
+==========================================================
+Test compression of incoming deltas on a thread pool
+==========================================================
+
+  $ hg init source
+  $ cd source
+  $ for i in `$TESTDIR/seq.py 1 10` ; do
+  > mkdir -p dir$i
+  > $TESTDIR/seq.py $i 500 > dir$i/file
+  > $TESTDIR/seq.py 1 $i > top$i
+  > done
+  $ hg commit -qAm initial
+  $ for i in `$TESTDIR/seq.py 1 10` ; do
+  > $TESTDIR/seq.py 1 $i >> dir$i/file
+  > echo $i >> top$i
+  > hg commit -qm change$i
+  > done
+  $ cd ..
+
+pulling with and without threads gives the same store
+
+  $ hg clone -q --pull source serial
+  $ hg clone -q --pull source threaded --config experimental.changegroup.apply-threads=4
+  $ hg -R threaded verify -q
+  $ for f in `cd source; hg files`; do
+  > hg -R serial debugindex $f > serial.idx
+  > hg -R threaded debugindex $f > threaded.idx
+  > cmp serial.idx threaded.idx || echo "$f differs"
+  > done
+  $ hg -R threaded log -T '{rev} {desc}\n' -l 2
+  10 change10
+  9 change9
+
+unbundling uses the thread pool too
+
+  $ hg -R source bundle -q --all all.hg
+  $ hg init unbundled
+  $ hg -R unbundled unbundle -q all.hg --config experimental.changegroup.apply-threads=2
+  $ hg -R unbundled verify -q
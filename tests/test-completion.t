@@ -77,8 +77,10 @@ Do not show debug commands if there are other candidates
 Show debug commands if there are no other candidates
   $ hg debugcomplete debug
   debug-delta-find
+  debug-redelta
   debug-repair-issue6528
   debug-revlog-index
+  debug-revlog-read-stats
   debug-revlog-stats
   debug::stable-tail-sort
   debug::stable-tail-sort-leaps
@@ -275,8 +277,10 @@ Show all commands + options
   continue: dry-run
   copy: forget, after, at-rev, force, include, exclude, dry-run
   debug-delta-find: changelog, manifest, dir, template, source
+  debug-redelta: max-revisions, cold-after, compression-level, restart
   debug-repair-issue6528: to-report, from-report, paranoid, dry-run
   debug-revlog-index: changelog, manifest, dir, template
+  debug-revlog-read-stats: changelog, manifest, dir, template, rev
   debug-revlog-stats: changelog, manifest, filelogs, template
   debug::stable-tail-sort: template
   debug::stable-tail-sort-leaps: template, specific
@@ -0,0 +1,64 @@
+import unittest
+
+import silenttestrunner
+
+from mercurial import policy
+from mercurial.dirstateutils import v2
+
+parsers = policy.importmod('parsers')
+
+
+def item():
+    return parsers.DirstateItem(wc_tracked=True, p1_tracked=True)
+
+
+class lazydirstatetests(unittest.TestCase):
+    def setUp(self):
+        self.map = {
+            b'a': item(),
+            b'b/c': item(),
+            b'b/d/e': item(),
+            b'b/d/f': item(),
+            b'g/h': item(),
+            b'untracked': parsers.DirstateItem(),
+        }
+        self.copies = {b'b/d/f': b'a'}
+        data, meta = v2.pack_dirstate(self.map, self.copies)
+        self.data = bytes(data)
+        self.meta = bytes(meta)
+        del self.map[b'untracked']
+
+    def testlookup(self):
+        m, c = v2.lazy_parse_dirstate(self.data, self.meta)
+        for path in self.map:
+            self.assertIn(path, m)
+            self.assertEqual(m[path].v2_data(), self.map[path].v2_data())
+        for path in (b'b', b'b/d', b'b/x', b'c', b'untracked', b'b/d/e/x'):
+            self.assertNotIn(path, m)
+            self.assertIsNone(m.get(path))
+        with self.assertRaises(KeyError):
+            m[b'b/d']
+        self.assertEqual(c.get(b'b/d/f'), b'a')
+        self.assertNotIn(b'b/d/e', c)
+        # nothing was parsed as a whole
+        self.assertIsNotNone(m._tree)
+
+    def testload(self):
+        m, c = v2.lazy_parse_dirstate(self.data, self.meta)
+        looked = m[b'b/d/e']
+        self.assertEqual(sorted(m), sorted(self.map))
+        self.assertIs(m[b'b/d/e'], looked)
+        self.assertEqual(dict(c), self.copies)
+
+    def testupdate(self):
+        m, c = v2.lazy_parse_dirstate(self.data, self.meta)
+        new = item()
+        m[b'z'] = new
+        del m[b'a']
+        self.assertIs(m[b'z'], new)
+        self.assertNotIn(b'a', m)
+        self.assertEqual(len(m), len(self.map))
+
+
+if __name__ == '__main__':
+    silenttestrunner.main(__name__)
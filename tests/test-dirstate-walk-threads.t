@@ -0,0 +1,60 @@
+==========================================================
+Test listing directories on a thread pool during walks
+==========================================================
+
+#require no-rust
+
+  $ hg init repo
+  $ cd repo
+  $ cat > .hgignore << EOF
+  > ^ignored/
+  > \.orig$
+  > EOF
+  $ for i in 1 2 3; do
+  >   for j in 1 2 3; do
+  >     mkdir -p dir$i/sub$j
+  >     echo $i$j > dir$i/sub$j/file
+  >   done
+  > done
+  $ hg commit -qAm initial
+  $ echo changed > dir1/sub2/file
+  $ rm dir2/sub3/file
+  $ mkdir -p dir3/new/deeper ignored
+  $ echo new > dir3/new/deeper/file
+  $ echo new > dir2/sub1/other
+  $ echo ignored > ignored/file
+  $ echo ignored > dir1/file.orig
+
+walking with and without threads gives the same results
+
+  $ hg status -A > ../serial
+  $ hg status -A --config experimental.dirstate.walk-threads=4 > ../threaded
+  $ cmp ../serial ../threaded
+  $ cat ../threaded
+  M dir1/sub2/file
+  ! dir2/sub3/file
+  ? dir2/sub1/other
+  ? dir3/new/deeper/file
+  I dir1/file.orig
+  I ignored/file
+  C .hgignore
+  C dir1/sub1/file
+  C dir1/sub3/file
+  C dir2/sub1/file
+  C dir2/sub2/file
+  C dir3/sub1/file
+  C dir3/sub2/file
+  C dir3/sub3/file
+
+patterns are honored
+
+  $ hg status --config experimental.dirstate.walk-threads=4 dir2 dir3/new
+  ! dir2/sub3/file
+  ? dir2/sub1/other
+  ? dir3/new/deeper/file
+  $ hg status --config experimental.dirstate.walk-threads=4 -I 'dir3/**'
+  ? dir3/new/deeper/file
+  $ hg purge --print --config extensions.purge= --config experimental.dirstate.walk-threads=4
+  dir2/sub1/other
+  dir3/new/deeper/file
+  dir2/sub3
@@ -0,0 +1,61 @@
+==========================================================
+Test the inotify backend of the fsmonitor extension
+==========================================================
+
+#require inotify no-fsmonitor
+
+  $ cat >> $HGRCPATH << EOF
+  > [extensions]
+  > fsmonitor =
+  > [fsmonitor]
+  > backend = inotify
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ mkdir -p dir/sub
+  $ echo a > dir/sub/a
+  $ echo b > b
+  $ echo '^ignored$' > .hgignore
+
+the watcher is started by the first status
+
+  $ hg status --debug
+  ? .hgignore
+  ? b
+  ? dir/sub/a
+  $ test -S .hg/fsmonitor-inotify.sock
+  $ hg commit -qAm 0
+
+later status only look at the files changed since the previous one
+
+  $ echo changed > b
+  $ mkdir -p new/deep
+  $ echo c > new/deep/c
+  $ echo ignored > ignored
+  $ rm dir/sub/a
+  $ hg status --debug
+  M b
+  ! dir/sub/a
+  ? new/deep/c
+  $ hg status -i
+  I ignored
+
+  $ hg revert -q dir/sub/a
+  $ hg add -q new
+  $ hg commit -qm 1
+  $ hg status --debug
+
+moving a directory away makes the watcher start over
+
+  $ mv new moved
+  $ hg status --debug
+  ! new/deep/c
+  ? moved/deep/c
+  $ hg status --debug
+  ! new/deep/c
+  ? moved/deep/c
+
+  $ hg debug-fsmonitor-inotify --stop
+  $ hg debug-fsmonitor-inotify --stop
+  no inotify watcher running
@@ -994,11 +994,15 @@ Test list of internal help commands
   
    debug-delta-find
                  display the computation to get to a valid delta for storing REV
+   debug-redelta
+                 recompute the deltas of the filelogs and manifests
    debug-repair-issue6528
                  find affected revisions and repair them. See issue6528 for more
                  details.
    debug-revlog-index
                  dump index data for a revlog
+   debug-revlog-read-stats
+                 display how the revisions of a revlog are read
    debug-revlog-stats
                  display statistics about revlogs in the store
    debug::stable-tail-sort
@@ -0,0 +1,106 @@
+==============================================
+Test the cache of manifest fulltexts shared between processes
+==============================================
+
+  $ cat << EOF >> $HGRCPATH
+  > [extensions]
+  > blackbox =
+  > [blackbox]
+  > track = revlog-read-stats
+  > EOF
+
+  $ count_entries() {
+  >   $PYTHON -c "
+  > import struct
+  > data = open('.hg/cache/manifestsharedcache', 'rb').read()
+  > print(struct.unpack('>I', data[:4])[0])
+  > "
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 1 2 3 4; do
+  >   $TESTDIR/seq.py $i 100 > file-$i
+  >   hg commit -qAm $i
+  > done
+
+the cache is disabled by default
+
+  $ rm -f .hg/wcache/manifestfulltextcache
+  $ hg manifest -r 0
+  file-1
+  $ test -f .hg/cache/manifestsharedcache
+  [1]
+
+  $ cat >> .hg/hgrc << EOF
+  > [experimental]
+  > manifest.shared-cache.max-size = 1M
+  > EOF
+
+manifests read by a process are kept for the others
+
+  $ rm -f .hg/wcache/manifestfulltextcache
+  $ hg manifest -r 0 --config experimental.revlog.read-stats=yes
+  file-1
+  $ hg manifest -r 2 --config experimental.revlog.read-stats=yes
+  file-1
+  file-2
+  file-3
+  $ count_entries
+  2
+  $ grep 00manifest .hg/blackbox.log | wc -l | sed 's/ //g'
+  2
+
+  $ rm -f .hg/wcache/manifestfulltextcache .hg/blackbox.log
+  $ hg manifest -r 0 --config experimental.revlog.read-stats=yes
+  file-1
+  $ hg manifest -r 2 --config experimental.revlog.read-stats=yes
+  file-1
+  file-2
+  file-3
+  $ grep 00manifest .hg/blackbox.log
+  [1]
+
+new manifests are added to the cache
+
+  $ echo 5 > file-5
+  $ hg commit -qAm 5
+  $ count_entries
+  4
+  $ rm -f .hg/wcache/manifestfulltextcache
+  $ hg manifest -r 4 --config experimental.revlog.read-stats=yes
+  file-1
+  file-2
+  file-3
+  file-4
+  file-5
+  $ grep 00manifest .hg/blackbox.log
+  [1]
+
+the cache is bounded, the most recent entries are kept
+
+  $ rm .hg/cache/manifestsharedcache
+  $ for r in 0 1 2 3; do
+  >   rm -f .hg/wcache/manifestfulltextcache
+  >   hg manifest -r $r --config experimental.manifest.shared-cache.max-size=300
+  > done | wc -l | sed 's/ //g'
+  10
+  $ count_entries
+  2
+  $ rm -f .hg/blackbox.log .hg/wcache/manifestfulltextcache
+  $ hg manifest -r 3 --config experimental.revlog.read-stats=yes > /dev/null
+  $ grep 00manifest .hg/blackbox.log
+  [1]
+
+a corrupted cache is ignored
+
+  $ echo garbage > .hg/cache/manifestsharedcache
+  $ rm -f .hg/wcache/manifestfulltextcache
+  $ hg manifest -r 1
+  file-1
+  file-2
+  $ count_entries
+  1
+  $ hg verify -q
+
+  $ cd ..
@@ -236,6 +236,45 @@ class basemanifesttests:
         }
         self.assertEqual(want, pruned.diff(short, clean=True))
 
+    def testManifestIterDiff(self):
+        MISSING = (None, b'')
+        left = self.parsemanifest(20, A_DEEPER_MANIFEST)
+        right = left.copy()
+        right[b'a/b/c/bar.py'] = BIN_HASH_1
+        right.setflag(b'a/c/paris.py', b'x')
+        del right[b'a/d/apple.py']
+        right[b'a/d/zebra.py'] = BIN_HASH_2
+        want = [
+            (b'a/b/c/bar.py', (BIN_HASH_3, b''), (BIN_HASH_1, b'')),
+            (b'a/c/paris.py', (BIN_HASH_2, b''), (BIN_HASH_2, b'x')),
+            (b'a/d/apple.py', (BIN_HASH_3, b''), MISSING),
+            (b'a/d/zebra.py', MISSING, (BIN_HASH_2, b'')),
+        ]
+        self.assertEqual(want, list(left.iterdiff(right)))
+
+        match = matchmod.match(
+            util.localpath(b'/repo'), b'', [b'a/d'], default=b'relpath'
+        )
+        self.assertEqual(want[2:], list(left.iterdiff(right, match)))
+        match = matchmod.exact([b'a/c/paris.py', b'a/d/zebra.py'])
+        want = [want[1], want[3]]
+        self.assertEqual(want, list(left.iterdiff(right, match)))
+
+        match = matchmod.match(
+            util.localpath(b'/repo'), b'', [b'a/c'], default=b'relpath'
+        )
+        want = [
+            (b'a/c/london.py', (BIN_HASH_3, b'l'), (BIN_HASH_3, b'l')),
+            (b'a/c/paper.txt', (BIN_HASH_2, b'l'), (BIN_HASH_2, b'l')),
+            (b'a/c/paris.py', (BIN_HASH_2, b''), (BIN_HASH_2, b'x')),
+        ]
+        self.assertEqual(want, list(left.iterdiff(right, match, clean=True)))
+
+        # the changes are generated in path order
+        diff = left.diff(right, clean=True)
+        items = list(left.iterdiff(right, clean=True))
+        self.assertEqual(sorted(diff), [fn for fn, v1, v2 in items])
+
     def testReversedLines(self):
         backwards = b''.join(
             l + b'\n' for l in reversed(A_SHORT_MANIFEST.split(b'\n')) if l
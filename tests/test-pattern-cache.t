@@ -0,0 +1,70 @@
+#require no-rust
+
+Parsed ignore files and the regular expressions built from them can be kept
+in a cache in .hg/cache
+
+  $ cat >> $HGRCPATH << EOF
+  > [experimental]
+  > pattern-cache = yes
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ touch a.o b.c c.txt
+  $ mkdir build
+  $ touch build/out
+  $ cat > .hgignore << EOF
+  > syntax: glob
+  > *.o
+  > build/
+  > EOF
+
+  $ hg status
+  ? .hgignore
+  ? b.c
+  ? c.txt
+  $ test -f .hg/cache/patterns
+
+A second run is served from the cache
+
+  $ hg status
+  ? .hgignore
+  ? b.c
+  ? c.txt
+  $ hg status -i
+  I a.o
+  I build/out
+
+Changing the ignore file misses the cache
+
+  $ echo 'c.*' >> .hgignore
+  $ hg status
+  ? .hgignore
+  ? b.c
+  $ hg debugignore
+  <includematcher includes='.*\\.o(?:/|$)|(?:|.*/)build(?:/|$)|(?:|.*/)c\\.[^/]*(?:/|$)'>
+
+Warnings are not lost by caching
+
+  $ echo 'syntax: nonsense' >> .hgignore
+  $ hg status
+  $TESTTMP/repo/.hgignore: ignoring invalid syntax 'nonsense'
+  ? .hgignore
+  ? b.c
+  $ hg status
+  $TESTTMP/repo/.hgignore: ignoring invalid syntax 'nonsense'
+  ? .hgignore
+  ? b.c
+
+A broken cache file is ignored and rewritten
+
+  $ echo garbage > .hg/cache/patterns
+  $ hg status -i
+  $TESTTMP/repo/.hgignore: ignoring invalid syntax 'nonsense'
+  I a.o
+  I build/out
+  I c.txt
+  $ head -c 15 .hg/cache/patterns; echo
+  patterncache-v1
+
+  $ cd ..
@@ -0,0 +1,91 @@
+===============================================
+Test the persistent on-disk nodemap of filelogs
+===============================================
+
+  $ cat << EOF >> $HGRCPATH
+  > [format]
+  > use-persistent-nodemap=yes
+  > [devel]
+  > persistent-nodemap=yes
+  > [storage]
+  > revlog.persistent-nodemap.slow-path=allow
+  > revlog.persistent-nodemap.filelogs=yes
+  > revlog.persistent-nodemap.filelogs.min-revisions=10
+  > EOF
+
+  $ hg init test-repo
+  $ cd test-repo
+  $ hg debugbuilddag .+200
+  $ hg up -q tip
+
+A filelog too big to be inline gets a nodemap once it reaches the threshold
+
+  $ "$PYTHON" -c "import random; random.seed(1); print(random.randbytes(200000).hex())" > big
+  $ for i in `$TESTDIR/seq.py 1 9` ; do
+  >   echo $i >> big
+  >   echo $i > small
+  >   hg commit -qAm $i
+  > done
+  $ ls .hg/store/data
+  big.d
+  big.i
+  small.i
+  $ echo 10 >> big
+  $ hg commit -qm 10
+  $ ls .hg/store/data | grep -v undo
+  big-*.nd (glob)
+  big.d
+  big.i
+  big.n
+  small.i
+  $ hg debugnodemap --metadata big | grep tip
+  tip-rev: 9
+  tip-node: * (glob)
+  $ hg debugnodemap --check big
+  revisions in index:   10
+  revisions in nodemap: 10
+
+It is updated by the next transactions
+
+  $ for i in `$TESTDIR/seq.py 11 13` ; do
+  >   echo $i >> big
+  >   hg commit -qm $i
+  > done
+  $ hg debugnodemap --metadata big | grep tip-rev
+  tip-rev: 12
+  $ hg debugnodemap --check big
+  revisions in index:   13
+  revisions in nodemap: 13
+  $ ls .hg/store/data | grep '\.nd$' | wc -l | sed 's/ //g'
+  1
+  $ hg verify -q
+
+A stripped filelog does not use the outdated nodemap
+
+  $ hg debugstrip -q -r tip
+  $ hg log -r tip -T '{rev}\n' big
+  212
+  $ hg verify -q
+
+Existing filelogs get a nodemap when the caches are updated
+
+  $ hg debugupdatecaches
+  $ hg debugnodemap --metadata big | grep tip-rev
+  tip-rev: 11
+  $ hg debugnodemap --metadata small
+  $ hg debugupdatecaches --config storage.revlog.persistent-nodemap.filelogs.min-revisions=1
+  $ hg debugnodemap --metadata small
+  $ hg debugnodemap --metadata big | grep tip-rev
+  tip-rev: 11
+
+Downgrading the repository deletes the filelog nodemaps
+
+  $ hg debugupgraderepo --run --quiet --no-backup \
+  >     --config format.use-persistent-nodemap=no > /dev/null
+  $ ls .hg/store/data | grep -v undo
+  big.d
+  big.i
+  small.i
+  $ hg verify -q
+
+  $ cd ..
@@ -78,6 +78,7 @@ As a result, -1 passed from Rust for the null revision became 4294967295 in C.
   compression:        zlib (no-zstd !)
   compression:        zstd (zstd !)
   compression-level:  default
+  zstd-dictionary:     no
   $ hg debugbuilddag .+5000 --new-file
 
   $ hg debugnodemap --metadata
@@ -804,6 +805,7 @@ downgrading
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zstd    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugupgraderepo --run --no-backup --quiet
   upgrade will perform the following actions:
   
@@ -846,6 +848,7 @@ upgrading
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zstd    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugupgraderepo --run --no-backup --quiet
   upgrade will perform the following actions:
   
@@ -0,0 +1,79 @@
+=========================================================
+Test the incremental re-delta of filelogs and manifests
+=========================================================
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `$TESTDIR/seq.py 1 20` ; do
+  >   for j in `$TESTDIR/seq.py 1 3` ; do
+  >     $TESTDIR/seq.py $i $j 500 > file-$j
+  >   done
+  >   hg commit -qAm $i
+  > done
+  $ for i in `$TESTDIR/seq.py 1 3` ; do
+  >   echo $i >> file-3
+  >   hg commit -qm more-$i
+  > done
+  $ hg cat -r 10 file-2 > expected
+
+the work can be split between several runs
+
+  $ hg debug-redelta --max-revisions 30 --verbose
+  rewriting 00manifest.i
+  rewriting data/file-1.i
+  43 revisions rewritten in 2 revlogs
+  stopped early, run the command again to resume
+  $ test -f .hg/redelta-state
+  $ hg verify -q
+  $ hg debug-redelta --verbose
+  rewriting data/file-2.i
+  rewriting data/file-3.i
+  43 revisions rewritten in 2 revlogs
+  $ test -f .hg/redelta-state
+  [1]
+  $ hg verify -q
+  $ hg cat -r 10 file-2 | cmp expected -
+
+recently modified revlogs can be skipped
+
+  $ hg debug-redelta --cold-after 2 --verbose
+  rewriting data/file-1.i
+  rewriting data/file-2.i
+  40 revisions rewritten in 2 revlogs
+
+the progress of an interrupted run can be discarded
+
+  $ hg debug-redelta --max-revisions 1 --quiet
+  $ hg debug-redelta --restart --verbose --compression-level 9
+  rewriting 00manifest.i
+  rewriting data/file-1.i
+  rewriting data/file-2.i
+  rewriting data/file-3.i
+  86 revisions rewritten in 4 revlogs
+  $ hg verify -q
+  $ hg cat -r 10 file-2 | cmp expected -
+
+  $ hg debug-redelta --compression-level high
+  abort: invalid compression level: high
+  [10]
+
+revlogs too big to stay inline are rewritten too
+
+  $ cd ..
+  $ hg init big
+  $ cd big
+  $ for i in `$TESTDIR/seq.py 1 4` ; do
+  >   "$PYTHON" -c "import random; random.seed($i); print(random.randbytes(100000).hex())" > file
+  >   hg commit -qAm $i
+  > done
+  $ hg cat -r 2 file > expected
+  $ hg debug-redelta --quiet
+  $ ls .hg/store/data
+  file.d
+  file.i
+  undo.backup.file.d.bck
+  undo.backup.file.i.bck
+  $ hg verify -q
+  $ hg cat -r 2 file | cmp expected -
+
+  $ cd ..
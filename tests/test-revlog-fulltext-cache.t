@@ -0,0 +1,55 @@
+===============================================
+Test the persistent cache of revision fulltexts
+===============================================
+
+  $ cat << EOF >> $HGRCPATH
+  > [experimental]
+  > revlog.fulltext-cache.max-size = 1M
+  > revlog.fulltext-cache.min-chain-length = 10
+  > EOF
+
+setting up a repository with a long delta chain
+
+  $ hg init repo
+  $ cd repo
+  $ touch a
+  $ hg add a
+  $ hg commit -qm base
+  $ for i in `$TESTDIR/seq.py 1 20` ; do
+  > $TESTDIR/seq.py $i 200 > a
+  > hg commit -qm $i
+  > done
+  $ rm -rf .hg/cache/fulltext
+
+short chains are not cached
+
+  $ hg cat -r 5 a | head -1
+  5
+  $ test -d .hg/cache/fulltext
+  [1]
+
+long chains are cached
+
+  $ hg cat -r 20 a | head -1
+  20
+  $ find .hg/cache/fulltext -type f | wc -l | sed 's/ //g'
+  1
+
+the cached fulltext is used by later processes (and still validated)
+
+  $ for f in `find .hg/cache/fulltext -type f`; do echo garbage > $f; done
+  $ hg cat -r 20 a
+  abort: integrity check failed on a:20
+  [50]
+  $ rm -rf .hg/cache/fulltext
+  $ hg cat -r 20 a | head -1
+  20
+
+the cache is bounded in size
+
+  $ hg cat -r 19 a --config experimental.revlog.fulltext-cache.max-size=1000 | head -1
+  19
+  $ find .hg/cache/fulltext -type f | wc -l | sed 's/ //g'
+  1
+
+  $ cd ..
@@ -52,4 +52,19 @@ do not mmap index which is still less than 32k
   97
   96
 
+mmap data file of non-inline revlogs when requested
+
+  $ "$PYTHON" -c 'import hashlib, sys; sys.stdout.write("".join("%d %s\n" % (i, hashlib.sha256(b"%d" % i).hexdigest()) for i in range(5000)))' > big
+  $ hg commit -qAm big
+  $ test -f .hg/store/data/big.d
+  $ hg cat -r tip big -o out --config experimental.mmapdatathreshold=4k
+  mmapping $TESTTMP/a/.hg/store/data/big.d
+  $ tail -1 out
+  4999 5343f4c9e3a3d41e260befe71a0c1d1f581a7edeeb3de0570f2bff43f82ed905
+
+do not mmap data file smaller than the threshold
+  $ hg cat -r tip big -o out --config experimental.mmapdatathreshold=1m
+  $ tail -1 out
+  4999 5343f4c9e3a3d41e260befe71a0c1d1f581a7edeeb3de0570f2bff43f82ed905
+
   $ cd ..
@@ -0,0 +1,54 @@
+===================================================
+Test the persistent cache of sparse-revlog snapshots
+===================================================
+
+  $ cat << EOF >> $HGRCPATH
+  > [format]
+  > sparse-revlog = yes
+  > maxchainlen = 4
+  > EOF
+
+  $ commit_many() {
+  >   for i in `$TESTDIR/seq.py $1 $2` ; do
+  >     $TESTDIR/seq.py 1 1000 | sed "`expr $i \* 31 % 1000 + 1`s/.*/x$i/" > a
+  >     hg commit -qAm $i
+  >   done
+  > }
+
+building the same history with and without the cache
+
+  $ hg init cached
+  $ cat << EOF >> cached/.hg/hgrc
+  > [experimental]
+  > revlog.persistent-snapshot-cache = yes
+  > EOF
+  $ hg init uncached
+  $ cd cached
+  $ commit_many 1 30
+  $ ls .hg/cache/snapshots | wc -l | sed 's/ //g'
+  3
+  $ cd ../uncached
+  $ commit_many 1 30
+  $ cd ..
+
+the cache does not change the deltas picked
+
+  $ hg -R cached debugdeltachain a -T '{rev} {deltatype} {chainlen}\n' > cached.chain
+  $ hg -R uncached debugdeltachain a -T '{rev} {deltatype} {chainlen}\n' > uncached.chain
+  $ cmp cached.chain uncached.chain
+  $ grep snap cached.chain | wc -l | sed 's/ //g'
+  7
+
+a stripped revlog does not use the outdated cache
+
+  $ hg -R cached debugstrip -q -r 25
+  $ hg -R uncached debugstrip -q -r 25
+  $ cd cached
+  $ commit_many 40 60
+  $ cd ../uncached
+  $ commit_many 40 60
+  $ cd ..
+  $ hg -R cached debugdeltachain a -T '{rev} {deltatype} {chainlen}\n' > cached.chain
+  $ hg -R uncached debugdeltachain a -T '{rev} {deltatype} {chainlen}\n' > uncached.chain
+  $ cmp cached.chain uncached.chain
+  $ hg -R cached verify -q
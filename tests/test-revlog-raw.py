@@ -492,6 +492,24 @@ def findsnapshottest(rlog):
         print('  got:      %s' % result15)
 
 
+def revisionstest(rlog):
+    """check that revisions() matches revision() and rawdata()"""
+    rlog.clearcaches()
+    allrevs = list(rlog) + [-1]
+    expected = [(r, rlog.revision(r)) for r in sorted(allrevs)]
+    expectedraw = [(r, rlog.rawdata(r)) for r in sorted(allrevs)]
+    rlog.clearcaches()
+    for revs in (allrevs, allrevs[::-1], allrevs[::3]):
+        want = [e for e in expected if e[0] in revs]
+        got = list(rlog.revisions(revs))
+        if got != want:
+            abort('revisions() differs for %r' % revs)
+        want = [e for e in expectedraw if e[0] in revs]
+        got = list(rlog.revisions(revs, raw=True))
+        if got != want:
+            abort('revisions(raw=True) differs for %r' % revs)
+
+
 def maintest():
     with newtransaction() as tr:
         rl = newrevlog(recreate=True)
@@ -518,6 +536,9 @@ def maintest():
         rl5 = makesnapshot(tr)
         issnapshottest(rl5)
         print('issnapshot test passed')
+        revisionstest(rl)
+        revisionstest(rl5)
+        print('revisions test passed')
         findsnapshottest(rl5)
         print('findsnapshot test passed')
 
@@ -0,0 +1,54 @@
+==============================================
+Test the instrumentation of the revlog reads
+==============================================
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `$TESTDIR/seq.py 1 20` ; do
+  >   $TESTDIR/seq.py $i 200 > a
+  >   hg commit -qAm $i
+  > done
+
+statistics of a single revlog
+
+  $ hg debug-revlog-read-stats a
+  chunk-cache-hits:          19
+  chunk-cache-misses:        1
+  mmap-reads:                0
+  bytes-read:                * (glob)
+  uncompressed-cache-hits:   0
+  uncompressed-cache-misses: 20
+  decompressions:            1
+  chains:                    20
+  chain-revs:                20
+  max-chain-length:          1
+  deltachain-time:           * (glob)
+  patch-time:                * (glob)
+
+reading a revision alone restores its whole delta chain
+
+  $ hg debug-revlog-read-stats a --rev 19 \
+  >     -T '{chains} {chain_revs} {max_chain_length}\n'
+  1 20 20
+
+  $ hg debug-revlog-read-stats a --rev 20
+  abort: unknown revision: 20
+  [10]
+
+collecting the statistics of any command
+
+  $ cat >> $HGRCPATH << EOF
+  > [extensions]
+  > blackbox=
+  > [blackbox]
+  > track = revlog-read-stats
+  > [experimental]
+  > revlog.read-stats = yes
+  > EOF
+  $ hg cat -r 10 a > /dev/null
+  $ cat .hg/blackbox.log | sed 's/.*> //; s/-time=[0-9.]*/-time=*/g'
+  00changelog: chunk-cache-hits=1 chunk-cache-misses=0 mmap-reads=0 bytes-read=0 uncompressed-cache-hits=0 uncompressed-cache-misses=1 decompressions=0 chains=1 chain-revs=1 max-chain-length=1 deltachain-time=* patch-time=*
+  00manifest: chunk-cache-hits=1 chunk-cache-misses=0 mmap-reads=0 bytes-read=0 uncompressed-cache-hits=0 uncompressed-cache-misses=1 decompressions=0 chains=1 chain-revs=1 max-chain-length=1 deltachain-time=* patch-time=*
+  a: chunk-cache-hits=1 chunk-cache-misses=0 mmap-reads=0 bytes-read=0 uncompressed-cache-hits=0 uncompressed-cache-misses=11 decompressions=1 chains=1 chain-revs=11 max-chain-length=11 deltachain-time=* patch-time=*
+
+  $ cd ..
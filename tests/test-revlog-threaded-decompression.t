@@ -0,0 +1,29 @@
+======================================================
+Test decompression of revlog chunks on a thread pool
+======================================================
+
+setting up a repository with a long delta chain
+
+  $ hg init repo
+  $ cd repo
+  $ touch a
+  $ hg add a
+  $ hg commit -qm base
+  $ for i in `$TESTDIR/seq.py 1 40` ; do
+  > $TESTDIR/seq.py $i 200 > a
+  > hg commit -qm $i
+  > done
+
+  $ hg debugdeltachain a -r 40 -T '{chainlen}\n'
+  40
+
+  $ hg cat -r tip a > expected
+
+threaded decompression gives the same content
+
+  $ hg cat -r tip a --config experimental.revlog.decompression-threads=4 > got
+  $ cmp expected got
+
+  $ hg verify -q --config experimental.revlog.decompression-threads=4
+
+  $ cd ..
@@ -0,0 +1,81 @@
+#require zstd
+
+===================================================
+Test revlog compression with a shared zstd dictionary
+===================================================
+
+  $ cat << EOF >> $HGRCPATH
+  > [format]
+  > revlog-compression=zstd
+  > EOF
+
+setting up a repository with many similar files
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `$TESTDIR/seq.py 1 30` ; do
+  >   for j in `$TESTDIR/seq.py 1 10` ; do
+  >     $TESTDIR/seq.py $i $j 200 > file-$j
+  >   done
+  >   hg commit -qAm $i
+  > done
+  $ hg cat -r 15 file-5 > expected
+
+enabling the dictionary trains it while recompressing the revlogs
+
+  $ hg debugupgraderepo --run --no-backup --quiet \
+  >     --config format.exp-revlog-zstd-dictionary=yes > /dev/null
+  $ hg debugrequires | grep dictionary
+  exp-revlog-zstd-dictionary
+  $ hg debugformat | grep dictionary
+  zstd-dictionary:    yes
+  $ test -f .hg/store/revlog-zstd-dict
+  $ hg verify -q
+  $ hg cat -r 15 file-5 | cmp expected -
+
+new content is compressed with the dictionary
+
+  $ cat >> .hg/hgrc << EOF
+  > [format]
+  > exp-revlog-zstd-dictionary=yes
+  > EOF
+  $ echo more >> file-1
+  $ hg commit -qm more
+  $ hg verify -q
+
+upgrading only some revlogs keeps the existing dictionary
+
+  $ cp .hg/store/revlog-zstd-dict ../dict-before
+  $ hg debugupgraderepo --run --no-backup --quiet --optimize re-delta-parent \
+  >     --changelog > /dev/null
+  $ cmp ../dict-before .hg/store/revlog-zstd-dict
+  $ hg verify -q
+
+the dictionary is transferred by stream clones
+
+  $ cd ..
+  $ hg clone --stream -U repo stream-clone -q
+  $ test -f stream-clone/.hg/store/revlog-zstd-dict
+  $ hg -R stream-clone debugrequires | grep dictionary
+  exp-revlog-zstd-dictionary
+  $ hg -R stream-clone verify -q
+
+and by local clones
+
+  $ hg clone -U repo local-clone -q
+  $ test -f local-clone/.hg/store/revlog-zstd-dict
+  $ hg -R local-clone verify -q
+
+removing the dictionary recompresses everything without it
+
+  $ cd repo
+  $ hg debugupgraderepo --run --no-backup --quiet \
+  >     --config format.exp-revlog-zstd-dictionary=no > /dev/null
+  $ hg debugrequires | grep dictionary
+  [1]
+  $ test -f .hg/store/revlog-zstd-dict
+  [1]
+  $ hg verify -q
+  $ hg cat -r 15 file-5 | cmp expected -
+
+  $ cd ..
@@ -0,0 +1,79 @@
+==========================================================
+Test hashing possibly clean files on a thread pool
+==========================================================
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `$TESTDIR/seq.py 1 20`; do
+  >   echo $i > file$i
+  > done
+  $ printf '\1\nstarts with a metadata marker\n' > marker
+  $ hg commit -qAm initial
+  $ hg cp file1 copied
+#if symlink
+  $ ln -s file1 link
+  $ hg add link
+#endif
+  $ hg commit -qm copy
+
+Make every file ambiguous for the dirstate, change some of them without
+changing their size
+
+  $ echo 02 > file2
+  $ echo 99 > file19
+  $ rm file20
+  $ mkdir file20
+  $ touch -t 200001010000 `hg files`
+
+  $ hg status -A --config experimental.status.lookup-threads=4
+  M file19
+  M file2
+  ! file20
+  C copied
+  C file1
+  C file10
+  C file11
+  C file12
+  C file13
+  C file14
+  C file15
+  C file16
+  C file17
+  C file18
+  C file3
+  C file4
+  C file5
+  C file6
+  C file7
+  C file8
+  C file9
+  C link (symlink !)
+  C marker
+
+clean files are recorded in the dirstate with their new modification time,
+so they are not read again
+
+  $ hg debugdirstate --dates | grep ' 2000-01-01 ' | awk '{print $NF}'
+  copied
+  file1
+  file10
+  file11
+  file12
+  file13
+  file14
+  file15
+  file16
+  file17
+  file18
+  file3
+  file4
+  file5
+  file6
+  file7
+  file8
+  file9
+  marker
+  $ hg status --config experimental.status.lookup-threads=4
+  M file19
+  M file2
+  ! file20
@@ -0,0 +1,98 @@
+=================================================
+Test the persistent cache of tree manifest subtrees
+=================================================
+
+  $ cat << EOF >> $HGRCPATH
+  > [experimental]
+  > treemanifest = yes
+  > [extensions]
+  > blackbox =
+  > [blackbox]
+  > track = revlog-read-stats
+  > EOF
+
+  $ count_entries() {
+  >   $PYTHON -c "
+  > import struct
+  > data = open('.hg/cache/manifestsubtreecache', 'rb').read()
+  > count = 0
+  > while data:
+  >     size = struct.unpack('>L', data[20:24])[0]
+  >     data = data[24 + size:]
+  >     count += 1
+  > print(count)
+  > "
+  > }
+
+  $ hg init repo
+  $ cd repo
+  $ for d in a b c; do
+  >   for s in x y; do
+  >     mkdir -p $d/$s
+  >     echo 1 > $d/$s/f
+  >   done
+  > done
+  $ hg commit -qAm 0
+  $ echo 2 > a/x/f
+  $ hg commit -m 1
+  $ echo 2 > c/y/f
+  $ hg commit -m 2
+
+the cache is disabled by default
+
+  $ hg status --rev 0 --rev 2
+  M a/x/f
+  M c/y/f
+  $ test -f .hg/cache/manifestsubtreecache
+  [1]
+
+  $ cat >> .hg/hgrc << EOF
+  > [experimental]
+  > treemanifest.subtree-cache-size = 100
+  > EOF
+
+only the directories that differ and that the matcher can reach are read
+
+  $ hg status --rev 0 --rev 2 c
+  M c/y/f
+  $ count_entries
+  6
+
+directories with the same content share their entry
+
+  $ hg status --rev 0 --rev 2
+  M a/x/f
+  M c/y/f
+  $ count_entries
+  7
+
+later commands do not read the directory revlogs again
+
+  $ hg status --rev 0 --rev 2 --config experimental.revlog.read-stats=yes
+  M a/x/f
+  M c/y/f
+  $ grep -c 00manifest .hg/blackbox.log
+  0
+  [1]
+
+  $ rm .hg/cache/manifestsubtreecache .hg/blackbox.log
+  $ hg status --rev 0 --rev 2 --config experimental.revlog.read-stats=yes
+  M a/x/f
+  M c/y/f
+  $ grep 00manifest .hg/blackbox.log | sed 's/.*> //; s/:.*//'
+  00manifest
+  meta/a/00manifest
+  meta/a/x/00manifest
+  meta/c/00manifest
+  meta/c/y/00manifest
+
+the cache is bounded
+
+  $ hg diff -r 0 -r 2 --stat --config experimental.treemanifest.subtree-cache-size=3
+   a/x/f |  2 +-
+   c/y/f |  2 +-
+   2 files changed, 2 insertions(+), 2 deletions(-)
+  $ count_entries
+  3
+
+  $ cd ..
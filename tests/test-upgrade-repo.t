@@ -227,6 +227,7 @@ An upgrade of a repository created with recommended settings only suggests optim
   plain-cl-delta:     yes
   compression:        zlib
   compression-level:  default
+  zstd-dictionary:     no
   $ hg debugformat --verbose
   format-variant     repo config default
   fncache:            yes    yes     yes
@@ -245,6 +246,7 @@ An upgrade of a repository created with recommended settings only suggests optim
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zlib   zlib    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugformat --verbose --config format.usefncache=no
   format-variant     repo config default
   fncache:            yes     no     yes
@@ -263,6 +265,7 @@ An upgrade of a repository created with recommended settings only suggests optim
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zlib   zlib    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugformat --verbose --config format.usefncache=no --color=debug
   format-variant     repo config default
   [formatvariant.name.mismatchconfig|fncache:           ][formatvariant.repo.mismatchconfig| yes][formatvariant.config.special|     no][formatvariant.default|     yes]
@@ -281,6 +284,7 @@ An upgrade of a repository created with recommended settings only suggests optim
   [formatvariant.name.uptodate|compression:       ][formatvariant.repo.uptodate| zlib][formatvariant.config.default|   zlib][formatvariant.default|    zlib] (no-zstd !)
   [formatvariant.name.mismatchdefault|compression:       ][formatvariant.repo.mismatchdefault| zlib][formatvariant.config.special|   zlib][formatvariant.default|    zstd] (zstd !)
   [formatvariant.name.uptodate|compression-level: ][formatvariant.repo.uptodate| default][formatvariant.config.default| default][formatvariant.default| default]
+  [formatvariant.name.uptodate|zstd-dictionary:   ][formatvariant.repo.uptodate|  no][formatvariant.config.default|     no][formatvariant.default|      no]
   $ hg debugformat -Tjson
   [
    {
@@ -369,6 +373,12 @@ An upgrade of a repository created with recommended settings only suggests optim
     "default": "default",
     "name": "compression-level",
     "repo": "default"
+   },
+   {
+    "config": false,
+    "default": false,
+    "name": "zstd-dictionary",
+    "repo": false
    }
   ]
   $ hg debugupgraderepo
@@ -525,6 +535,7 @@ Various sub-optimal detections work
   plain-cl-delta:     yes
   compression:        zlib
   compression-level:  default
+  zstd-dictionary:     no
   $ hg debugformat --verbose
   format-variant     repo config default
   fncache:             no    yes     yes
@@ -543,6 +554,7 @@ Various sub-optimal detections work
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zlib   zlib    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugformat --verbose --config format.usegeneraldelta=no
   format-variant     repo config default
   fncache:             no    yes     yes
@@ -561,6 +573,7 @@ Various sub-optimal detections work
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zlib   zlib    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugformat --verbose --config format.usegeneraldelta=no --color=debug
   format-variant     repo config default
   [formatvariant.name.mismatchconfig|fncache:           ][formatvariant.repo.mismatchconfig|  no][formatvariant.config.default|    yes][formatvariant.default|     yes]
@@ -579,6 +592,7 @@ Various sub-optimal detections work
   [formatvariant.name.uptodate|compression:       ][formatvariant.repo.uptodate| zlib][formatvariant.config.default|   zlib][formatvariant.default|    zlib] (no-zstd !)
   [formatvariant.name.mismatchdefault|compression:       ][formatvariant.repo.mismatchdefault| zlib][formatvariant.config.special|   zlib][formatvariant.default|    zstd] (zstd !)
   [formatvariant.name.uptodate|compression-level: ][formatvariant.repo.uptodate| default][formatvariant.config.default| default][formatvariant.default| default]
+  [formatvariant.name.uptodate|zstd-dictionary:   ][formatvariant.repo.uptodate|  no][formatvariant.config.default|     no][formatvariant.default|      no]
   $ hg debugupgraderepo
   note:    selecting all-filelogs for processing to change: dotencode
   note:    selecting all-manifestlogs for processing to change: dotencode
@@ -1589,6 +1603,7 @@ upgrade
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zlib    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugrequires
   dotencode
   fncache
@@ -1633,6 +1648,7 @@ downgrade
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zlib   zlib    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugrequires
   dotencode
   fncache
@@ -1680,6 +1696,7 @@ upgrade from hgrc
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zstd    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugrequires
   dotencode
   fncache
@@ -1733,6 +1750,7 @@ upgrade
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zstd    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugrequires
   dotencode
   exp-revlogv2.2
@@ -1783,6 +1801,7 @@ downgrade
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zstd    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugrequires
   dotencode
   fncache
@@ -1834,6 +1853,7 @@ upgrade from hgrc
   compression:        zlib   zlib    zlib (no-zstd !)
   compression:        zstd   zstd    zstd (zstd !)
   compression-level:  default default default
+  zstd-dictionary:     no     no      no
   $ hg debugrequires
   dotencode
   exp-revlogv2.2